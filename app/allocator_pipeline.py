@@ -1,36 +1,62 @@
-from notion_client import Client
 from .config import SETTINGS
-from .notion_client import query_allocators_needing_research, get_allocator_record
-from .llm_jobs import call_enrich_allocator_profile
-from .notion_update import update_allocator_from_llm
+from .notion_client import iter_allocators_needing_research, query_allocators_needing_research
+from .llm_jobs import call_enrich_allocator_profile, call_enrich_allocator_profile_batch, profile_is_fresh
+from .notion_update import profile_from_page, update_allocator_from_llm
 from .snapshots import log_snapshot
 from .web_collect import collect_web_text
 from .web_search import enrich_allocator_with_search
 from .clay_client import enrich_with_clay
+from .cache import TTLCache, MISSING
+import atexit
 import logging
 import httpx
+import orjson
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logger = logging.getLogger(__name__)
 
+# Background pool for pipeline steps that don't depend on each other
+# (e.g. the Clay push can run while we write the LLM output to Notion).
+_SIDE_TASKS = ThreadPoolExecutor(max_workers=SETTINGS.batch_concurrency, thread_name_prefix="allocator-side")
+
+# Snapshot input_sources only ever take these shapes; encode them once
+# rather than building and serializing a fresh dict per allocator.
+_SOURCES_WITH_SEARCH = orjson.dumps({"web": True, "clay": True, "search": True})
+_SOURCES_WITHOUT_SEARCH = orjson.dumps({"web": True, "clay": True, "search": False})
+_NO_SOURCES = b"{}"
+
+# Shared client for redirect resolution so HEAD requests reuse connections
+_RESOLVE_CLIENT = httpx.Client(follow_redirects=True, timeout=10, http2=True)
+atexit.register(_RESOLVE_CLIENT.close)
+
+# Redirect targets rarely change; remember them (including failures) for a day
+_RESOLVED_DOMAINS = TTLCache(maxsize=1024, ttl=86400)
+
 
 def resolve_final_domain(url: str) -> str:
     """Follow redirects and return the final domain."""
     if not url:
         return None
     
+    cache_key = url.strip().rstrip("/").lower()
+    cached = _RESOLVED_DOMAINS.get(cache_key)
+    if cached is not MISSING:
+        return cached
+    
     try:
         # Follow redirects to get final URL
-        with httpx.Client(follow_redirects=True, timeout=10) as client:
-            resp = client.head(url)
-            final_url = str(resp.url)
-            from urllib.parse import urlparse
-            parsed = urlparse(final_url)
-            domain = parsed.netloc.replace("www.", "")
-            logger.info(f"Resolved {url} -> {final_url} (domain: {domain})")
-            return domain
+        resp = _RESOLVE_CLIENT.head(url)
+        final_url = str(resp.url)
+        parsed = urlparse(final_url)
+        domain = parsed.netloc.removeprefix("www.")
+        logger.info(f"Resolved {url} -> {final_url} (domain: {domain})")
     except Exception as e:
         logger.warning(f"Could not resolve {url}: {e}")
-        return None
+        domain = None
+    
+    _RESOLVED_DOMAINS.set(cache_key, domain)
+    return domain
 
 
 def extract_domain(page) -> str:
@@ -40,21 +66,23 @@ def extract_domain(page) -> str:
     # Try Main Website first
     website = props.get("Main Website", {}).get("url")
     if website:
+        parsed = urlparse(website)
+        # A bare host (no path/query) is already canonical - skip the HEAD request
+        if parsed.netloc and parsed.path in ("", "/") and not parsed.query:
+            return parsed.netloc.removeprefix("www.")
         # Try to resolve redirects
         resolved = resolve_final_domain(website)
         if resolved:
             return resolved
         # Fallback to just parsing the URL
-        from urllib.parse import urlparse
-        parsed = urlparse(website)
-        return parsed.netloc.replace("www.", "")
+        return parsed.netloc.removeprefix("www.")
     
     # Try Domain field
     domain_prop = props.get("Domain", {}).get("rich_text", [])
     if domain_prop:
-        domain = domain_prop[0].get("plain_text", "").replace("www.", "")
-        # Try to resolve if it looks like a domain
-        if domain and "." in domain:
+        domain = domain_prop[0].get("plain_text", "").removeprefix("www.").rstrip("/")
+        # Try to resolve if it looks like a domain with a path (bare hosts are canonical)
+        if domain and "." in domain and "/" in domain:
             resolved = resolve_final_domain(f"https://{domain}")
             if resolved:
                 return resolved
@@ -63,72 +91,153 @@ def extract_domain(page) -> str:
     return None
 
 
-def run_allocator(page):
+def get_allocator_name(page) -> str:
+    name_prop = page.get("properties", {}).get("Name", {}).get("title", [])
+    return name_prop[0]["plain_text"] if name_prop else "Unknown"
+
+
+def collect_allocator_sources(page, name: str) -> tuple:
+    """STEPS 0-1: web search + scraping. Returns (search_results, texts)."""
+    domain = extract_domain(page)
+    
+    # STEP 0: Web Search to find investment pages
+    search_results = enrich_allocator_with_search(name, domain)
+    logger.info(f"Search found: investments={search_results.get('investments_url')}, report={search_results.get('annual_report_url')}")
+    
+    # STEP 1: Web text (enhanced with search-discovered URLs)
+    texts = collect_web_text(page, discovered_urls=search_results)
+    logger.info(f"Collected web text - about: {len(texts.get('about_text', ''))}, policy: {len(texts.get('policy_text', ''))}, report: {len(texts.get('report_text', ''))}")
+    
+    add_search_context(texts, search_results)
+    return search_results, texts
+
+
+def add_search_context(texts: dict, search_results: dict):
+    """Add the search snippets to the scraped texts as search_context."""
+    if search_results.get("search_snippets"):
+        texts["search_context"] = "\n\n".join(search_results["search_snippets"])
+        logger.info(f"Added {len(search_results['search_snippets'])} search snippets to context")
+
+
+def _finish_allocator(page, name: str, enriched: dict, search_results: dict):
+    """STEPS 3-5: Notion write, Clay push and success snapshot."""
     allocator_id = page["id"]
-    props = page.get("properties", {})
-    name_prop = props.get("Name", {}).get("title", [])
-    name = name_prop[0]["plain_text"] if name_prop else "Unknown"
+    populated = sum(1 for v in enriched.values() if v is not None and v != [])
+    logger.info(f"LLM returned {populated} non-null fields")
+    logger.info(f"LLM output: {enriched}")
+
+    # STEP 4: Clay People (independent of the Notion write, so overlap them)
+    clay_future = _SIDE_TASKS.submit(enrich_with_clay, page)
+
+    # STEP 3: Write into Notion
+    update_allocator_from_llm(allocator_id, enriched)
+    logger.info(f"Updated Notion for {name}")
+
+    clay_people = clay_future.result()
+    # Add contact extraction LLM if needed
+
+    # STEP 5: Snapshot
+    log_snapshot(
+        allocator_id,
+        status="Success",
+        input_sources=_SOURCES_WITH_SEARCH if search_results.get("search_snippets") else _SOURCES_WITHOUT_SEARCH,
+        summary=enriched.get("research_notes"),
+        raw_json=enriched
+    )
+
+
+def _record_failure(page, name: str, e: Exception):
+    logger.error(f"Error processing {name}: {e}", exc_info=True)
+    log_snapshot(
+        page["id"],
+        status="Failed",
+        input_sources=_NO_SOURCES,
+        summary=None,
+        raw_json=None,
+        error=str(e)
+    )
+
+
+def run_allocator(page, force_llm=False):
+    allocator_id = page["id"]
+    name = get_allocator_name(page)
     
     logger.info(f"Processing allocator: {name} ({allocator_id})")
 
     try:
-        domain = extract_domain(page)
-        
-        # STEP 0: Web Search to find investment pages
-        search_results = enrich_allocator_with_search(name, domain)
-        logger.info(f"Search found: investments={search_results.get('investments_url')}, report={search_results.get('annual_report_url')}")
-        
-        # STEP 1: Web text (enhanced with search-discovered URLs)
-        texts = collect_web_text(page, discovered_urls=search_results)
-        logger.info(f"Collected web text - about: {len(texts.get('about_text', ''))}, policy: {len(texts.get('policy_text', ''))}, report: {len(texts.get('report_text', ''))}")
-        
-        # Add search snippets to the text context
-        if search_results.get("search_snippets"):
-            snippet_text = "\n\n".join(search_results["search_snippets"])
-            texts["search_context"] = snippet_text
-            logger.info(f"Added {len(search_results['search_snippets'])} search snippets to context")
+        existing_profile = profile_from_page(page)
+        if not force_llm and profile_is_fresh(existing_profile):
+            # Nothing to gain from scraping again; leave the page as is
+            logger.info(f"{name}: profile complete and fresh, skipping research")
+            return True
+
+        search_results, texts = collect_allocator_sources(page, name)
 
         # STEP 2: LLM Structuring
-        enriched = call_enrich_allocator_profile(name, {}, texts)
-        logger.info(f"LLM returned {len([k for k, v in enriched.items() if v is not None and v != []])} non-null fields")
-        logger.info(f"LLM output: {enriched}")
-
-        # STEP 3: Write into Notion
-        update_allocator_from_llm(allocator_id, enriched)
-        logger.info(f"Updated Notion for {name}")
-
-        # STEP 4: Clay People
-        clay_people = enrich_with_clay(page)
-        # Add contact extraction LLM if needed
-
-        # STEP 5: Snapshot
-        log_snapshot(
-            allocator_id,
-            status="Success",
-            input_sources={"web": True, "clay": True, "search": bool(search_results.get("search_snippets"))},
-            summary=enriched.get("research_notes"),
-            raw_json=enriched
-        )
+        enriched = call_enrich_allocator_profile(name, existing_profile, texts, force_llm=force_llm, no_cache=force_llm)
+
+        _finish_allocator(page, name, enriched, search_results)
         return True
 
     except Exception as e:
-        logger.error(f"Error processing {name}: {e}", exc_info=True)
-        log_snapshot(
-            allocator_id,
-            status="Failed",
-            input_sources={},
-            summary=None,
-            raw_json=None,
-            error=str(e)
-        )
+        _record_failure(page, name, e)
         return False
 
 
+def _run_batch_via_message_batches(allocators: list, executor: ThreadPoolExecutor) -> int:
+    """
+    Batch-mode pipeline: scrape every allocator in parallel, send all prompts
+    to Claude as one Message Batch, then write the results back in parallel.
+    """
+    def prepare(page):
+        name = get_allocator_name(page)
+        logger.info(f"Collecting sources for allocator: {name} ({page['id']})")
+        try:
+            search_results, texts = collect_allocator_sources(page, name)
+            return page, name, search_results, texts
+        except Exception as e:
+            _record_failure(page, name, e)
+            return None
+
+    def finish(args):
+        page, name, search_results, _texts, enriched = args
+        try:
+            _finish_allocator(page, name, enriched, search_results)
+            return True
+        except Exception as e:
+            _record_failure(page, name, e)
+            return False
+
+    prepared = [p for p in executor.map(prepare, allocators) if p]
+    try:
+        enriched = call_enrich_allocator_profile_batch(
+            [(page["id"], name, {}, texts) for page, name, _, texts in prepared]
+        )
+    except Exception as e:
+        # The whole batch failed: snapshot it per allocator, but leave the
+        # pages (and Last Research Run) alone so the next run retries them
+        for page, name, _, _ in prepared:
+            _record_failure(page, name, e)
+        return 0
+    return sum(executor.map(finish, [(*p, e) for p, e in zip(prepared, enriched)]))
+
+
 def run_batch_allocator_research(limit=20):
-    allocators = query_allocators_needing_research(limit)
-    logger.info(f"Found {len(allocators)} allocators needing research")
-    count = 0
-    for page in allocators:
-        if run_allocator(page):
-            count += 1
-    return count
+    # Each allocator is dominated by network waits (search, scraping, LLM, Notion),
+    # so overlap them with a bounded pool. run_allocator never raises.
+    workers = max(1, min(SETTINGS.batch_concurrency, limit))
+
+    if SETTINGS.llm_batch_mode:
+        allocators = query_allocators_needing_research(limit)
+        logger.info(f"Found {len(allocators)} allocators needing research")
+        if not allocators:
+            return 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return _run_batch_via_message_batches(allocators, executor)
+
+    # Start researching as soon as each Notion result page arrives rather
+    # than waiting for the whole query
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_allocator, page) for page in iter_allocators_needing_research(limit)]
+        logger.info(f"Found {len(futures)} allocators needing research")
+        return sum(1 for f in as_completed(futures) if f.result())
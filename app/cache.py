@@ -0,0 +1,113 @@
+"""
+In-process caches shared by the pipeline modules.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel for cache misses, so None can be cached as a (negative) result
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 86400):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache:
+    """
+    Bytes-valued cache persisted as one file per key, so it survives
+    restarts. Oldest files (by mtime) are pruned beyond max_entries.
+    Entries are counted in memory, so the directory is only scanned when
+    the count passes the cap, and pruning leaves ~10% headroom so the next
+    scan is that many writes away.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1000, suffix: str = ".json"):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._count = self._entry_count()
+
+    def _entry_count(self) -> int:
+        return sum(1 for e in os.scandir(self.directory) if e.name.endswith(self.suffix))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key: str, value: bytes):
+        path = self._path(key)
+        is_new = not os.path.exists(path)
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if is_new:
+            with self._lock:
+                self._count += 1
+                if self._count > self.max_entries:
+                    self._prune()
+
+    def _prune(self):
+        # Called with self._lock held
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(self.suffix)]
+        keep = self.max_entries - self.max_entries // 10
+        if len(entries) > keep:
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            for entry in entries[:len(entries) - keep]:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+        self._count = self._entry_count()
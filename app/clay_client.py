@@ -10,10 +10,14 @@ This module handles the outbound push to Clay.
 The inbound webhook from Clay is handled by a separate endpoint in main.py.
 """
 
+import atexit
 import logging
 import httpx
-from typing import Optional
+import orjson
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
 from .config import SETTINGS
+from .retry import is_unsent_error, retry_http
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,39 +26,45 @@ logger = logging.getLogger(__name__)
 # This should be configured in environment variables
 CLAY_FIND_PEOPLE_WEBHOOK = "https://api.clay.com/v3/sources/webhook/pull-in-data-from-a-webhook-d1314276-05c8-4be6-84ba-44bae195c0f2"
 
+# Shared client so webhook pushes reuse pooled TLS connections
+_CLIENT = httpx.Client(
+    timeout=30.0,
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=20),
+)
+atexit.register(_CLIENT.close)
+
+
+# Notion property type -> extractor(prop, default)
+_EXTRACTORS: Dict[str, Callable[[dict, str], str]] = {
+    "title": lambda p, d: p["title"][0].get("plain_text", d) if p.get("title") else d,
+    "rich_text": lambda p, d: p["rich_text"][0].get("plain_text", d) if p.get("rich_text") else d,
+    "url": lambda p, d: p.get("url") or d,
+    "email": lambda p, d: p.get("email") or d,
+    "select": lambda p, d: p["select"].get("name", d) if p.get("select") else d,
+}
+
 
 def get_property_value(page: dict, property_name: str, default: str = "") -> str:
     """
     Extract a property value from a Notion page object.
     Handles different property types (title, rich_text, url, etc.)
     """
-    props = page.get("properties", {})
-    
-    if property_name not in props:
-        return default
-    
-    prop = props[property_name]
-    prop_type = prop.get("type")
-    
-    if prop_type == "title":
-        titles = prop.get("title", [])
-        return titles[0].get("plain_text", default) if titles else default
-    
-    elif prop_type == "rich_text":
-        texts = prop.get("rich_text", [])
-        return texts[0].get("plain_text", default) if texts else default
-    
-    elif prop_type == "url":
-        return prop.get("url", default) or default
-    
-    elif prop_type == "email":
-        return prop.get("email", default) or default
-    
-    elif prop_type == "select":
-        select = prop.get("select")
-        return select.get("name", default) if select else default
-    
-    return default
+    return PageView(page).get(property_name, default)
+
+
+class PageView:
+    """Read several properties from one Notion page without re-walking it."""
+
+    def __init__(self, page: dict):
+        self._props = page.get("properties", {})
+
+    def get(self, property_name: str, default: str = "") -> str:
+        prop = self._props.get(property_name)
+        if prop is None:
+            return default
+        extractor = _EXTRACTORS.get(prop.get("type"))
+        return extractor(prop, default) if extractor else default
 
 
 def push_to_clay_find_people(
@@ -92,21 +102,21 @@ def push_to_clay_find_people(
     logger.info(f"Pushing to Clay Find People: {firm_name} ({domain})")
     
     try:
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(
-                url,
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            
-            logger.info(f"Successfully pushed {firm_name} to Clay")
-            return {
-                "success": True,
-                "status_code": response.status_code,
-                "firm_name": firm_name
-            }
-            
+        body = orjson.dumps(payload)
+        # Each POST adds a (billed) Clay row; only resend when it can't have landed
+        response = retry_http(lambda: _CLIENT.post(
+            url,
+            content=body,
+            headers={"Content-Type": "application/json"}
+        ), retryable=is_unsent_error)
+        
+        logger.info(f"Successfully pushed {firm_name} to Clay")
+        return {
+            "success": True,
+            "status_code": response.status_code,
+            "firm_name": firm_name
+        }
+        
     except httpx.HTTPStatusError as e:
         logger.error(f"Clay HTTP error for {firm_name}: {e.response.status_code}")
         return {
@@ -160,21 +170,21 @@ def push_contact_to_clay_enrich(
     logger.info(f"Pushing to Clay Enrich Contact: {name} at {company}")
     
     try:
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(
-                url,
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            
-            logger.info(f"Successfully pushed {name} to Clay")
-            return {
-                "success": True,
-                "status_code": response.status_code,
-                "name": name
-            }
-            
+        body = orjson.dumps(payload)
+        # Each POST adds a (billed) Clay row; only resend when it can't have landed
+        response = retry_http(lambda: _CLIENT.post(
+            url,
+            content=body,
+            headers={"Content-Type": "application/json"}
+        ), retryable=is_unsent_error)
+        
+        logger.info(f"Successfully pushed {name} to Clay")
+        return {
+            "success": True,
+            "status_code": response.status_code,
+            "name": name
+        }
+        
     except httpx.HTTPStatusError as e:
         logger.error(f"Clay HTTP error for {name}: {e.response.status_code}")
         return {
@@ -204,15 +214,8 @@ def extract_domain_from_url(url: str) -> str:
         url = "https://" + url
     
     try:
-        from urllib.parse import urlparse
         parsed = urlparse(url)
-        domain = parsed.netloc
-        
-        # Remove www. prefix
-        if domain.startswith("www."):
-            domain = domain[4:]
-        
-        return domain
+        return parsed.netloc.removeprefix("www.")
     except Exception:
         return ""
 
@@ -235,10 +238,11 @@ def enrich_with_clay(page: dict) -> list:
     page_id = page.get("id", "")
     
     # Try to extract firm details from the page
-    firm_name = get_property_value(page, "Firm Name") or get_property_value(page, "Name")
-    website = get_property_value(page, "Website") or get_property_value(page, "Main Website")
-    firm_type = get_property_value(page, "Firm Type") or get_property_value(page, "Type")
-    location = get_property_value(page, "Location / Headquarters Location") or get_property_value(page, "Location")
+    view = PageView(page)
+    firm_name = view.get("Firm Name") or view.get("Name")
+    website = view.get("Website") or view.get("Main Website")
+    firm_type = view.get("Firm Type") or view.get("Type")
+    location = view.get("Location / Headquarters Location") or view.get("Location")
     
     if not firm_name:
         logger.warning(f"No firm name found for page {page_id}")
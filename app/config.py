@@ -14,6 +14,18 @@ class Settings:
     search_api_key: str = os.getenv("SEARCH_API_KEY", "")
     env: str = os.getenv("ENV", "prod")
     batch_limit: int = int(os.getenv("BATCH_LIMIT", "20"))
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    # Max Claude requests in flight at once across all threads (Anthropic rate limit)
+    claude_concurrency: int = int(os.getenv("CLAUDE_CONCURRENCY", "8"))
+    # Serper requests per second across all threads (keep under the plan's limit)
+    serper_rps: float = float(os.getenv("SERPER_RPS", "5"))
+    # Send nightly LLM extraction through Anthropic Message Batches (cheaper, slower)
+    llm_batch_mode: bool = os.getenv("LLM_BATCH_MODE", "").lower() in ("1", "true", "yes")
+
+    # Optional directory for replaying identical Claude requests across restarts
+    llm_cache_dir: str = os.getenv("LLM_CACHE_DIR", "")
+    # Optional directory for revalidating fetched pages/PDFs and reusing PDF text across runs
+    web_cache_dir: str = os.getenv("WEB_CACHE_DIR", "")
 
 
 SETTINGS = Settings()
@@ -1,12 +1,98 @@
-import json
-import os
+import atexit
+import functools
+import hashlib
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 import logging
 import httpx
+import orjson
 from .config import SETTINGS
+from .mapping_config import ALLOCATOR_FIELD_CONFIG
+from .retry import is_unsent_error, retry_call, retry_http
+from .cache import DiskCache, TTLCache
 
 logger = logging.getLogger(__name__)
 
 ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
+ANTHROPIC_BATCHES_URL = "https://api.anthropic.com/v1/messages/batches"
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+
+
+@functools.cache
+def _client() -> httpx.Client:
+    """
+    One pooled client for every Anthropic call so batches reuse the TLS
+    session. Built on first use: creating the SSL context is the slow part
+    of importing this module otherwise.
+    """
+    client = httpx.Client(
+        timeout=90,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+        http2=True,
+    )
+    atexit.register(client.close)
+    return client
+
+
+# Replay identical Claude requests (same model, prompt and sources) from
+# memory, and from disk when LLM_CACHE_DIR is set. Values are JSON bytes.
+_REPLAY_MEMORY = TTLCache(maxsize=256, ttl=86400)
+_REPLAY_DISK = DiskCache(SETTINGS.llm_cache_dir) if SETTINGS.llm_cache_dir else None
+
+# Allocators run on a thread pool; cap how many of them talk to Claude at once
+_CLAUDE_SLOTS = threading.BoundedSemaphore(SETTINGS.claude_concurrency)
+
+# Per-source character caps for the extraction prompt. Budget a source
+# leaves unused is handed to the sources that overflow their cap.
+MAX_PROMPT_REPORT_CHARS = 32000
+MAX_PROMPT_ABOUT_CHARS = 3000
+MAX_PROMPT_POLICY_CHARS = 3000
+MAX_PROMPT_SEARCH_CHARS = 6000
+PROMPT_SOURCE_CAPS = {
+    "report_text": MAX_PROMPT_REPORT_CHARS,
+    "about_text": MAX_PROMPT_ABOUT_CHARS,
+    "policy_text": MAX_PROMPT_POLICY_CHARS,
+    "search_context": MAX_PROMPT_SEARCH_CHARS,
+}
+
+# Total source budget across all sources, in tokens. Token counts are
+# approximated at ~4 characters per token for English prose.
+PROMPT_SOURCE_BUDGET_TOKENS = 11000
+CHARS_PER_TOKEN = 4
+
+# Signal terms for pulling relevant passages out of oversized reports, and
+# how much context to keep either side of each hit
+_SNIPPET_RE = re.compile(
+    r"\b(CIO|Chief Investment Officer|AUM|assets under management|commitments?|consultants?"
+    r"|asset allocation|allocation|emerging managers?|co-?invest(?:ment)?s?)\b",
+    re.IGNORECASE,
+)
+SNIPPET_WINDOW = 600
+
+# When a report has to be cut blindly, this share of the budget goes to its
+# tail, where CAFR schedules and commitment exhibits usually sit
+REPORT_TAIL_SHARE = 0.25
+
+# Report sections mentioning any of these are kept ahead of boilerplate
+REPORT_SECTION_KEYWORDS = ("investment", "allocation", "policy", "endowment", "portfolio", "commitment", "consultant")
+_REPORT_SECTION_SPLIT = re.compile(r"(?=\[Page \d+\])")
+
+# Claude sometimes wraps its JSON in a ```json ... ``` fence despite instructions
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+# A profile with all of these populated and researched within the window
+# is left alone unless the caller forces a fresh extraction
+PROFILE_KEY_FIELDS = ("org_type", "total_aum", "research_notes", "uses_consultants")
+PROFILE_FRESH_DAYS = 90
+
+# Streamed replies arrive as server-sent events; payloads follow this prefix
+_SSE_DATA_PREFIX = "data: "
+
+# Message Batches usually finish well inside an hour; give up after 6h
+BATCH_POLL_INTERVAL = 30  # seconds
+BATCH_MAX_WAIT = 6 * 60 * 60  # seconds
 
 # System prompt modeled after the working Plinian project structure
 EXTRACTION_SYSTEM_PROMPT = """You are a research analyst at Plinian Strategies. Your job is to extract factual information about institutional allocators from provided source documents.
@@ -110,99 +196,450 @@ Mercer, WTW, Aon, Cambridge Associates, Russell Investments, Callan Associates,
 Output valid JSON only. No markdown code fences. No explanation before or after."""
 
 
-def call_claude(user_content: str) -> dict:
-    """Call Claude API for extraction."""
-    if not SETTINGS.anthropic_api_key:
-        raise ValueError("ANTHROPIC_API_KEY not configured")
+# Static request parts, built once. The system prompt is identical for every
+# allocator; mark it cacheable so repeat calls reuse the prefilled prefix.
+_BASE_PARAMS = {
+    "model": CLAUDE_MODEL,
+    "max_tokens": 4096,
+    "temperature": 0,
+    "system": [
+        {"type": "text", "text": EXTRACTION_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+    ],
+}
+_HEADERS = None
+
+
+def _anthropic_headers() -> dict:
+    global _HEADERS
+    if _HEADERS is None:
+        if not SETTINGS.anthropic_api_key:
+            raise ValueError("ANTHROPIC_API_KEY not configured")
+        _HEADERS = {
+            "x-api-key": SETTINGS.anthropic_api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+    return _HEADERS
+
+
+# _BASE_PARAMS + stream flag, pre-encoded without the closing brace, so a
+# streamed request only has to encode its own messages
+_STREAM_BODY_PREFIX = orjson.dumps({**_BASE_PARAMS, "stream": True})[:-1]
+
+
+def _claude_params(user_content: str) -> dict:
+    return {**_BASE_PARAMS, "messages": [{"role": "user", "content": user_content}]}
+
+
+def _claude_stream_body(user_content: str) -> bytes:
+    """JSON body for a streamed request; same as _claude_params + stream=true."""
+    messages = orjson.dumps([{"role": "user", "content": user_content}])
+    return b"".join((_STREAM_BODY_PREFIX, b',"messages":', messages, b"}"))
+
+
+def _parse_claude_text(content: str) -> dict:
+    """Parse Claude's reply text as JSON, stripping any markdown code fence."""
+    match = _FENCE_RE.match(content)
+    content = match.group(1) if match else content.strip()
     
-    headers = {
-        "x-api-key": SETTINGS.anthropic_api_key,
-        "anthropic-version": "2023-06-01",
-        "content-type": "application/json"
-    }
+    return orjson.loads(content)
+
+
+def _parse_claude_message(data: dict) -> dict:
+    """Pull the JSON object out of a Claude message response."""
+    return _parse_claude_text(data["content"][0]["text"])
+
+
+def _json_body(obj) -> bytes:
+    """Compact UTF-8 JSON for request bodies (orjson never escapes non-ASCII)."""
+    return orjson.dumps(obj)
+
+
+def _stream_claude_text(headers: dict, body: bytes) -> str:
+    """
+    POST a streaming Messages request and return the concatenated reply text.
+    Aborts as soon as the reply visibly isn't JSON so we stop paying for
+    generated prose.
+    """
+    parts = []
+    sniffed = False
+    with _client().stream("POST", ANTHROPIC_API_URL, headers=headers, content=body) as resp:
+        if resp.is_error:
+            resp.read()
+            resp.raise_for_status()
+        
+        for line in resp.iter_lines():
+            if not line.startswith(_SSE_DATA_PREFIX):
+                continue
+            event = orjson.loads(line[len(_SSE_DATA_PREFIX):])
+            event_type = event.get("type")
+            
+            if event_type == "content_block_delta":
+                text = event["delta"].get("text")
+                if not text:
+                    continue
+                parts.append(text)
+                if not sniffed:
+                    head = "".join(parts).lstrip()
+                    if head:
+                        # A JSON reply opens with "{" (or a ``` fence around it)
+                        if head[0] not in "{`":
+                            raise ValueError(f"Claude replied with prose instead of JSON: {head[:80]!r}")
+                        sniffed = True
+            elif event_type == "message_stop":
+                break
+            elif event_type == "error":
+                raise RuntimeError(f"Claude stream error: {event.get('error')}")
     
-    payload = {
-        "model": "claude-sonnet-4-20250514",
-        "max_tokens": 4096,
-        "temperature": 0,
-        "system": EXTRACTION_SYSTEM_PROMPT,
-        "messages": [
-            {"role": "user", "content": user_content}
-        ]
-    }
+    return "".join(parts)
+
+
+def _replay_get(key: str):
+    cached = _REPLAY_MEMORY.get(key, None)
+    if cached is None and _REPLAY_DISK is not None:
+        cached = _REPLAY_DISK.get(key)
+        if cached is not None:
+            _REPLAY_MEMORY.set(key, cached)
+    # Decode on every hit so callers can mutate their copy
+    return orjson.loads(cached) if cached is not None else None
+
+
+def _replay_set(key: str, result: dict):
+    encoded = orjson.dumps(result)
+    _REPLAY_MEMORY.set(key, encoded)
+    if _REPLAY_DISK is not None:
+        try:
+            _REPLAY_DISK.set(key, encoded)
+        except OSError as e:
+            logger.warning(f"Could not write LLM replay cache: {e}")
+
+
+def call_claude(user_content: str, no_cache: bool = False) -> dict:
+    """
+    Call Claude API for extraction, streaming the reply. Identical requests
+    are answered from the replay cache unless no_cache is set.
+    """
+    headers = _anthropic_headers()
+    body = _claude_stream_body(user_content)
+    
+    key = hashlib.blake2b(body, digest_size=16).hexdigest()
+    if not no_cache:
+        cached = _replay_get(key)
+        if cached is not None:
+            logger.info(f"Replaying cached Claude response {key}")
+            return cached
+    
+    with _CLAUDE_SLOTS:
+        content = retry_call(lambda: _stream_claude_text(headers, body))
+    
+    result = _parse_claude_text(content)
+    _replay_set(key, result)
+    return result
+
+
+def _shrink_report_text(report_text: str, limit: int = MAX_PROMPT_REPORT_CHARS) -> str:
+    """
+    Fit report text into `limit` chars. When the text is too long, prefer
+    the passages around signal terms (_select_snippets); if those still
+    overflow, keep the "[Page N]" sections that mention investment keywords
+    (in document order) before falling back to head and tail.
+    """
+    if len(report_text) <= limit:
+        return report_text
     
-    resp = httpx.post(ANTHROPIC_API_URL, headers=headers, json=payload, timeout=90)
-    resp.raise_for_status()
+    snippets = _select_snippets(report_text)
+    if snippets and len(snippets) <= limit:
+        return snippets
     
-    data = resp.json()
-    content = data["content"][0]["text"]
+    sections = _REPORT_SECTION_SPLIT.split(report_text)
+    if len(sections) <= 1:
+        return _head_and_tail(report_text, limit)
     
-    # Parse JSON from response
-    content = content.strip()
-    if content.startswith("```json"):
-        content = content[7:]
-    if content.startswith("```"):
-        content = content[3:]
-    if content.endswith("```"):
-        content = content[:-3]
+    kept = []
+    size = 0
+    for section in sections:
+        lowered = section.lower()
+        if not any(kw in lowered for kw in REPORT_SECTION_KEYWORDS):
+            continue
+        if size + len(section) > limit:
+            break
+        kept.append(section)
+        size += len(section)
     
-    return json.loads(content.strip())
+    if not kept:
+        return _head_and_tail(report_text, limit)
+    return "".join(kept)
 
 
-def call_enrich_allocator_profile(allocator_name, existing_profile, texts):
+def _select_snippets(text: str, pattern: re.Pattern = _SNIPPET_RE, window: int = SNIPPET_WINDOW) -> str:
     """
-    Extract allocator profile from source texts using Claude.
-    Structured to prevent hallucination by grounding in source text.
+    Concatenate the +/- window char passages around every pattern match,
+    merging overlapping passages. Returns "" if nothing matches.
+    """
+    spans = []
+    for match in pattern.finditer(text):
+        start = max(0, match.start() - window)
+        end = min(len(text), match.end() + window)
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return "\n...\n".join(text[start:end] for start, end in spans)
+
+
+def _head_and_tail(text: str, limit: int) -> str:
+    """Cut text to ~limit chars keeping its start and its end."""
+    if len(text) <= limit:
+        return text
+    tail = int(limit * REPORT_TAIL_SHARE)
+    if not tail:
+        return text[:limit]
+    return f"{text[:limit - tail]}\n...\n{text[-tail:]}"
+
+
+def _fit_sources(sources: dict, total_budget_tokens: int = PROMPT_SOURCE_BUDGET_TOKENS) -> dict:
     """
+    Truncate prompt sources to a shared budget. Each source first gets up
+    to its PROMPT_SOURCE_CAPS cap; whatever the short sources leave unused
+    is then spread evenly over the sources still over their cap.
+    """
+    spare = total_budget_tokens * CHARS_PER_TOKEN
+    allowance = {}
+    for key, text in sources.items():
+        allowance[key] = min(len(text), PROMPT_SOURCE_CAPS.get(key, 0))
+        spare -= allowance[key]
+    
+    overflow = sorted((len(text) - allowance[key], key) for key, text in sources.items() if len(text) > allowance[key])
+    for i, (excess, key) in enumerate(overflow):
+        if spare <= 0:
+            break
+        grant = min(excess, spare // (len(overflow) - i))
+        allowance[key] += grant
+        spare -= grant
     
-    report_text = texts.get("report_text", "")
-    search_context = texts.get("search_context", "")
-    about_text = texts.get("about_text", "")
-    policy_text = texts.get("policy_text", "")
+    fitted = {}
+    for key, text in sources.items():
+        if key == "report_text":
+            fitted[key] = _shrink_report_text(text, allowance[key])
+        else:
+            fitted[key] = text[:allowance[key]]
+    return fitted
+
+
+def build_user_content(allocator_name: str, texts: dict) -> str:
+    """Build the source-labelled user message for one allocator."""
+    sources = _fit_sources({key: texts.get(key) or "" for key in PROMPT_SOURCE_CAPS})
     
     # Build the user message with clear source labeling
-    user_content = f"""ALLOCATOR TO RESEARCH: {allocator_name}
+    return f"""ALLOCATOR TO RESEARCH: {allocator_name}
 
 === SOURCE TEXT BEGINS ===
 
 [SOURCE: Board Book / Annual Report / CAFR]
-{report_text[:45000]}
+{sources["report_text"]}
 
 [SOURCE: Website - About Page]
-{about_text[:3000]}
+{sources["about_text"]}
 
 [SOURCE: Website - Investment Policy]
-{policy_text[:3000]}
+{sources["policy_text"]}
 
 [SOURCE: News Articles / Industry Publications]
-{search_context[:6000]}
+{sources["search_context"]}
 
 === SOURCE TEXT ENDS ===
 
 Extract the profile for {allocator_name} using ONLY the source text above.
 Remember: If you cannot find specific information (like CIO name) in the text above, use null. Do not use any external knowledge."""
 
+
+# Placeholder strings Claude sometimes emits instead of a JSON null
+_NULL_STRINGS = {"", "null", "none", "n/a", "unknown"}
+_NUMBER_JUNK_RE = re.compile(r"[$,\s]")
+
+
+def _normalize_value(field_type: str, value):
+    if isinstance(value, str) and value.strip().lower() in _NULL_STRINGS:
+        return None
+    if value is None:
+        return None
+    
+    if field_type == "number":
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return float(_NUMBER_JUNK_RE.sub("", str(value)))
+        except ValueError:
+            return None
+    
+    if field_type == "multi_select":
+        values = value if isinstance(value, list) else [value]
+        cleaned = [str(v) for v in values if v is not None and str(v).strip().lower() not in _NULL_STRINGS]
+        return cleaned or None
+    
+    if isinstance(value, list):
+        value = ", ".join(str(v) for v in value if v is not None)
+    return str(value) if value != "" else None
+
+
+def normalize_profile(result: dict) -> dict:
+    """
+    Coerce Claude's output to the types ALLOCATOR_FIELD_CONFIG declares, in
+    one pass: "null"-like strings become None, numbers arrive as floats,
+    multi-selects as lists of str. Keys outside the config pass through.
+    """
+    if not isinstance(result, dict):
+        raise ValueError(f"Claude returned {type(result).__name__}, expected a JSON object")
+    for key, value in result.items():
+        cfg = ALLOCATOR_FIELD_CONFIG.get(key)
+        if cfg:
+            result[key] = _normalize_value(cfg["type"], value)
+    return result
+
+
+def _log_extraction(result: dict):
+    populated = sum(1 for v in result.values() if v and v != "null")
+    logger.info(f"Claude returned {populated} non-null fields")
+    
+    # Log research_notes for debugging
+    if result.get("research_notes"):
+        logger.info(f"Research notes: {result['research_notes'][:500]}")
+
+
+def _failed_extraction(allocator_name: str, error) -> dict:
+    # Minimal result on failure
+    return {
+        "name": allocator_name,
+        "research_notes": f"Extraction failed: {str(error)}",
+        "org_type": None,
+        "total_aum": None
+    }
+
+
+def profile_is_fresh(existing_profile: dict) -> bool:
+    """True if every key field is populated and the last run is recent."""
+    if not existing_profile:
+        return False
+    if any(existing_profile.get(k) in (None, "", []) for k in PROFILE_KEY_FIELDS):
+        return False
+
+    last_run = existing_profile.get("last_research_run")
+    if not last_run:
+        return False
+    try:
+        last_run = datetime.fromisoformat(last_run)
+    except ValueError:
+        return False
+    if last_run.tzinfo is None:
+        last_run = last_run.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - last_run < timedelta(days=PROFILE_FRESH_DAYS)
+
+
+def call_enrich_allocator_profile(allocator_name, existing_profile, texts, force_llm=False, no_cache=False):
+    """
+    Extract allocator profile from source texts using Claude.
+    Structured to prevent hallucination by grounding in source text.
+    Returns existing_profile untouched when it is already complete and
+    fresh, unless force_llm is set. no_cache bypasses the replay cache.
+    """
+    if not force_llm and profile_is_fresh(existing_profile):
+        logger.info(f"{allocator_name}: all fields present, skipping LLM")
+        return existing_profile
+
+    user_content = build_user_content(allocator_name, texts)
+
     logger.info(f"Processing {allocator_name} with {len(user_content)} chars of source text")
 
     try:
         logger.info("Calling Claude for extraction")
-        result = call_claude(user_content)
-        
-        populated = len([k for k,v in result.items() if v and v != [] and v != "null"])
-        logger.info(f"Claude returned {populated} non-null fields")
-        
-        # Log research_notes for debugging
-        if result.get("research_notes"):
-            logger.info(f"Research notes: {result['research_notes'][:500]}")
-        
+        result = normalize_profile(call_claude(user_content, no_cache=no_cache))
+        _log_extraction(result)
         return result
         
     except Exception as e:
         logger.error(f"Claude extraction failed: {e}", exc_info=True)
-        # Return minimal result on failure
-        return {
-            "name": allocator_name,
-            "research_notes": f"Extraction failed: {str(e)}",
-            "org_type": None,
-            "total_aum": None
-        }
+        return _failed_extraction(allocator_name, e)
+
+
+def _cancel_batch(batch_id: str, headers: dict):
+    """Ask Anthropic to stop a batch we've given up on, so it stops billing."""
+    try:
+        resp = _client().post(f"{ANTHROPIC_BATCHES_URL}/{batch_id}/cancel", headers=headers, timeout=30)
+        resp.raise_for_status()
+        logger.warning(f"Cancelled Claude batch {batch_id}")
+    except Exception as e:
+        logger.error(f"Failed to cancel Claude batch {batch_id}: {e}")
+
+
+def call_enrich_allocator_profile_batch(items: list) -> list:
+    """
+    Extract many allocator profiles through the Anthropic Message Batches API.
+    
+    Args:
+        items: list of (allocator_id, allocator_name, existing_profile, texts)
+        
+    Returns:
+        list of profile dicts in the same order as items. Allocators whose
+        request failed get the same minimal result as call_enrich_allocator_profile.
+    
+    Raises if the batch as a whole fails (submit, polling, deadline or
+    results download): nothing was extracted then, so callers should not
+    write per-allocator results. A batch that misses the deadline is
+    cancelled first.
+    """
+    if not items:
+        return []
+
+    names = {allocator_id: name for allocator_id, name, _, _ in items}
+
+    headers = _anthropic_headers()
+    requests = [
+        {"custom_id": allocator_id, "params": _claude_params(build_user_content(name, texts))}
+        for allocator_id, name, _, texts in items
+    ]
+
+    body = _json_body({"requests": requests})
+    # Only resend the create when it can't have gone through: a timeout or
+    # 5xx may still have started a (billed) batch we'd then orphan
+    resp = retry_http(
+        lambda: _client().post(ANTHROPIC_BATCHES_URL, headers=headers, content=body, timeout=120),
+        retryable=is_unsent_error,
+    )
+    batch = orjson.loads(resp.content)
+    logger.info(f"Submitted Claude batch {batch['id']} with {len(requests)} requests")
+
+    deadline = time.monotonic() + BATCH_MAX_WAIT
+    while batch.get("processing_status") != "ended":
+        if time.monotonic() > deadline:
+            _cancel_batch(batch["id"], headers)
+            raise TimeoutError(f"Claude batch {batch['id']} did not finish within {BATCH_MAX_WAIT}s")
+        time.sleep(BATCH_POLL_INTERVAL)
+        resp = retry_http(lambda: _client().get(f"{ANTHROPIC_BATCHES_URL}/{batch['id']}", headers=headers, timeout=30))
+        batch = orjson.loads(resp.content)
+
+    logger.info(f"Claude batch {batch['id']} ended: {batch.get('request_counts')}")
+    resp = retry_http(lambda: _client().get(batch["results_url"], headers=headers, timeout=120))
+
+    results = {}
+    for line in resp.content.splitlines():
+        if not line.strip():
+            continue
+        entry = orjson.loads(line)
+        allocator_id = entry.get("custom_id")
+        outcome = entry.get("result", {})
+        name = names.get(allocator_id, "Unknown")
+        try:
+            if outcome.get("type") != "succeeded":
+                raise RuntimeError(f"batch request {outcome.get('type')}: {outcome.get('error')}")
+            results[allocator_id] = normalize_profile(_parse_claude_message(outcome["message"]))
+            _log_extraction(results[allocator_id])
+        except Exception as e:
+            logger.error(f"Claude batch extraction failed for {name}: {e}")
+            results[allocator_id] = _failed_extraction(name, e)
+
+    return [
+        results.get(allocator_id) or _failed_extraction(name, "missing from batch results")
+        for allocator_id, name, _, _ in items
+    ]
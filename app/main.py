@@ -1,7 +1,18 @@
 from fastapi import FastAPI, Request
-from .allocator_pipeline import run_batch_allocator_research
+from fastapi.concurrency import run_in_threadpool
+from .allocator_pipeline import (
+    add_search_context,
+    extract_domain,
+    get_allocator_name,
+    run_allocator,
+    run_batch_allocator_research,
+)
 from .config import SETTINGS
+from .llm_jobs import call_enrich_allocator_profile
+from .notion_client import PIPELINE_PROPERTIES, NotionWriteBatch, get_allocator_record
 from .notion_contacts import upsert_contact_for_allocator
+from .web_collect import collect_web_text, collect_web_text_from_url
+from .web_search import enrich_allocator_with_search
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -12,6 +23,10 @@ VERSION = "v19"  # Update this with each deployment
 app = FastAPI(title="Plinian Allocator Service")
 
 
+def _text_lengths(texts: dict) -> dict:
+    return {key: len(texts.get(key, "")) for key in ("about_text", "policy_text", "report_text", "search_context")}
+
+
 @app.get("/health")
 def health():
     return {"status": "ok", "env": SETTINGS.env, "version": VERSION}
@@ -60,30 +75,26 @@ async def clay_person_enriched(request: Request):
         
         # If we have a page ID, this is an update to existing prospect
         if notion_page_id and len(notion_page_id) > 10:
-            # Update existing page
-            from notion_client import Client
-            notion = Client(auth=SETTINGS.notion_api_key)
-            
-            properties = {}
+            # Update existing page in a single request
+            batch = NotionWriteBatch(notion_page_id)
             
             if contact_data.get("email"):
-                properties["Email"] = {"email": contact_data["email"]}
+                batch.set("Email", {"email": contact_data["email"]})
             
             if contact_data.get("linkedin_url"):
-                properties["LinkedIn URL"] = {"url": contact_data["linkedin_url"]}
+                batch.set("LinkedIn URL", {"url": contact_data["linkedin_url"]})
             
             if contact_data.get("title"):
-                properties["Title/Role"] = {"rich_text": [{"text": {"content": contact_data["title"]}}]}
+                batch.set("Title/Role", {"rich_text": [{"text": {"content": contact_data["title"]}}]})
             
-            if properties:
-                notion.pages.update(page_id=notion_page_id, properties=properties)
+            if await run_in_threadpool(batch.flush):
                 logger.info(f"Updated existing prospect: {name}")
                 return {"status": "updated", "page_id": notion_page_id, "name": name}
         
         # Otherwise create new contact (needs allocator_id)
         allocator_id = data.get("allocator_id") or data.get("firm_page_id")
         if allocator_id:
-            result_id = upsert_contact_for_allocator(allocator_id, contact_data)
+            result_id = await run_in_threadpool(upsert_contact_for_allocator, allocator_id, contact_data)
             logger.info(f"Created/updated contact: {name} -> {result_id}")
             return {"status": "created", "page_id": result_id, "name": name}
         
@@ -94,6 +105,13 @@ async def clay_person_enriched(request: Request):
         return {"error": str(e)}, 500
 
 
+def _as_flag(value) -> bool:
+    """Read a boolean flag from JSON or a query string: "false"/"0" are off."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
 @app.post("/enrich-firm")
 async def enrich_single_firm(request: Request):
     """
@@ -101,19 +119,20 @@ async def enrich_single_firm(request: Request):
     
     Query params:
         firm_id: Notion page ID of the firm to enrich
+        force: re-run research even if the profile is complete and fresh
     """
-    from .allocator_pipeline import run_allocator
-    from .notion_client import get_allocator_record
     
     data = await request.json() if request.headers.get("content-type") == "application/json" else {}
     firm_id = data.get("firm_id") or request.query_params.get("firm_id")
+    force = _as_flag(data["force"] if data.get("force") is not None else request.query_params.get("force"))
     
     if not firm_id:
         return {"error": "firm_id required"}, 400
     
     try:
-        page = get_allocator_record(firm_id)
-        success = run_allocator(page)
+        # The pipeline is blocking I/O; keep it off the event loop
+        page = await run_in_threadpool(get_allocator_record, firm_id, PIPELINE_PROPERTIES)
+        success = await run_in_threadpool(run_allocator, page, force_llm=force)
         return {"status": "success" if success else "failed", "firm_id": firm_id}
     except Exception as e:
         logger.error(f"Enrich firm error: {e}")
@@ -121,9 +140,8 @@ async def enrich_single_firm(request: Request):
 
 
 @app.get("/test-scrape")
-async def test_scrape(url: str = "https://investments.yale.edu"):
+def test_scrape(url: str = "https://investments.yale.edu"):
     """Test the web scraping functionality."""
-    from .web_collect import collect_web_text_from_url
     
     result = collect_web_text_from_url(url)
     return {
@@ -136,16 +154,13 @@ async def test_scrape(url: str = "https://investments.yale.edu"):
 
 
 @app.get("/debug-enrich")
-async def debug_enrich(name: str, domain: str = None):
+def debug_enrich(name: str, domain: str = None):
     """
     Debug endpoint: Run full enrichment pipeline and return all intermediate data.
     Does NOT write to Notion - just shows what would be extracted.
     
     Usage: /debug-enrich?name=Indiana%20Public%20Retirement%20System&domain=in.gov/inprs
     """
-    from .web_search import enrich_allocator_with_search
-    from .web_collect import collect_web_text
-    from .llm_jobs import call_enrich_allocator_profile
     
     result = {
         "allocator_name": name,
@@ -183,15 +198,9 @@ async def debug_enrich(name: str, domain: str = None):
         texts = collect_web_text(fake_page, discovered_urls=search_results)
         
         # Add search snippets
-        if search_results.get("search_snippets"):
-            texts["search_context"] = "\n\n".join(search_results["search_snippets"])
+        add_search_context(texts, search_results)
         
-        result["scraped_text_lengths"] = {
-            "about_text": len(texts.get("about_text", "")),
-            "policy_text": len(texts.get("policy_text", "")),
-            "report_text": len(texts.get("report_text", "")),
-            "search_context": len(texts.get("search_context", "")),
-        }
+        result["scraped_text_lengths"] = _text_lengths(texts)
         result["text_previews"] = {
             "about": texts.get("about_text", "")[:500],
             "policy": texts.get("policy_text", "")[:500],
@@ -209,9 +218,9 @@ async def debug_enrich(name: str, domain: str = None):
             result["llm_output"] = llm_output
             
             # Count non-null fields
-            non_null = {k: v for k, v in llm_output.items() if v is not None and v != [] and v != ""}
-            result["llm_fields_populated"] = len(non_null)
-            result["llm_populated_fields"] = list(non_null.keys())
+            populated = [k for k, v in llm_output.items() if v is not None and v != [] and v != ""]
+            result["llm_fields_populated"] = len(populated)
+            result["llm_populated_fields"] = populated
     except Exception as e:
         result["errors"].append(f"LLM error: {e}")
     
@@ -219,18 +228,13 @@ async def debug_enrich(name: str, domain: str = None):
 
 
 @app.get("/debug-batch-flow")
-async def debug_batch_flow(page_id: str):
+def debug_batch_flow(page_id: str):
     """
     Debug endpoint: Show exactly what the batch job sees for a specific Notion page.
     This mirrors the EXACT data flow of run_allocator() but without writing.
     
     Usage: /debug-batch-flow?page_id=YOUR_NOTION_PAGE_ID
     """
-    from .web_search import enrich_allocator_with_search
-    from .web_collect import collect_web_text
-    from .llm_jobs import call_enrich_allocator_profile
-    from .notion_client import get_allocator_record
-    from .allocator_pipeline import extract_domain
     
     result = {
         "page_id": page_id,
@@ -245,12 +249,11 @@ async def debug_batch_flow(page_id: str):
     
     try:
         # Get the actual Notion page (exactly like batch does)
-        page = get_allocator_record(page_id)
+        page = get_allocator_record(page_id, PIPELINE_PROPERTIES)
         
         # Extract name (exactly like batch does)
         props = page.get("properties", {})
-        name_prop = props.get("Name", {}).get("title", [])
-        name = name_prop[0]["plain_text"] if name_prop else "Unknown"
+        name = get_allocator_name(page)
         
         result["extracted_name"] = name
         result["notion_data"] = {
@@ -285,15 +288,9 @@ async def debug_batch_flow(page_id: str):
         texts = collect_web_text(page, discovered_urls=search_results)
         
         # Add search snippets (exactly like batch does)
-        if search_results.get("search_snippets"):
-            texts["search_context"] = "\n\n".join(search_results["search_snippets"])
+        add_search_context(texts, search_results)
         
-        result["scraped_text_lengths"] = {
-            "about_text": len(texts.get("about_text", "")),
-            "policy_text": len(texts.get("policy_text", "")),
-            "report_text": len(texts.get("report_text", "")),
-            "search_context": len(texts.get("search_context", "")),
-        }
+        result["scraped_text_lengths"] = _text_lengths(texts)
         result["report_preview"] = texts.get("report_text", "")[:2000]
         
     except Exception as e:
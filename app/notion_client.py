@@ -1,10 +1,142 @@
+import httpx
+import logging
+import orjson
+import random
+import threading
+import time
+from urllib.parse import unquote
 from notion_client import Client
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
 from .config import SETTINGS
+from .retry import RETRYABLE_STATUS_CODES
+from .throttle import TokenBucket
 
-notion = Client(auth=SETTINGS.notion_api_key)
+logger = logging.getLogger(__name__)
 
+# Notion allows ~3 requests/second per integration. Every client in the
+# process draws from this bucket, so parallel allocator runs queue up
+# instead of tripping 429s.
+NOTION_BUCKET = TokenBucket(rate=3, capacity=3)
 
-def get_allocator_record(page_id: str):
+
+# The bucket keeps us under the limit in steady state; these cover the
+# occasional 429 (sent with Retry-After) and transient 5xx/timeouts.
+NOTION_MAX_RETRIES = 3
+
+
+def _notion_retry_delay(error, attempt: int) -> float:
+    headers = getattr(error, "headers", None)
+    retry_after = headers.get("retry-after") if headers is not None else None
+    try:
+        return min(30.0, max(0.0, float(retry_after)))
+    except (TypeError, ValueError):
+        return min(30.0, 2 ** attempt + random.random() * 0.5)
+
+
+def _notion_unsent(error) -> bool:
+    """True if the failed request can't have reached Notion: a 429 or no connection."""
+    if getattr(error, "status", None) == 429:
+        return True
+    # The SDK turns every httpx timeout into RequestTimeoutError; the
+    # original stays on __context__
+    return isinstance(error, httpx.ConnectError) or isinstance(error.__context__, httpx.ConnectTimeout)
+
+
+class ThrottledNotionClient(Client):
+    """
+    Notion SDK client that waits for a NOTION_BUCKET token before each
+    request and retries rate-limited or transient failures.
+    """
+
+    def __init__(self, options=None, client=None, **kwargs):
+        if client is None:
+            # Everything goes to api.notion.com at <=3 req/s, so a handful of
+            # HTTP/2 connections (multiplexed streams) is plenty. HTTP/1.1
+            # stays enabled as a fallback if ALPN doesn't offer h2.
+            client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=30.0),
+            )
+        super().__init__(options, client, **kwargs)
+
+    def _build_request(self, method, path, query=None, body=None, auth=None):
+        # Same request as the SDK builds, but with the body encoded by orjson
+        headers = httpx.Headers()
+        if auth:
+            headers["Authorization"] = f"Bearer {auth}"
+        content = None
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            content = orjson.dumps(body)
+        self.logger.info(f"{method} {self.client.base_url}{path}")
+        return self.client.build_request(method, path, params=query, content=content, headers=headers)
+
+    def request(self, path, method, query=None, body=None, auth=None):
+        # A create that timed out or got a 5xx may still have been committed,
+        # and resending it would duplicate the page; only retry it when
+        # Notion can't have acted on it
+        is_create = method == "POST" and path.strip("/") == "pages"
+        attempt = 0
+        while True:
+            NOTION_BUCKET.acquire()
+            try:
+                return super().request(path, method, query=query, body=body, auth=auth)
+            except (HTTPResponseError, RequestTimeoutError, httpx.ConnectError) as e:
+                status = getattr(e, "status", None)
+                if attempt >= NOTION_MAX_RETRIES or (status is not None and status not in RETRYABLE_STATUS_CODES):
+                    raise
+                if is_create and not _notion_unsent(e):
+                    raise
+                delay = _notion_retry_delay(e, attempt)
+                logger.warning(f"Notion request failed ({status or type(e).__name__}), retrying in {delay:.1f}s (attempt {attempt + 1}/{NOTION_MAX_RETRIES})")
+                time.sleep(delay)
+                attempt += 1
+
+
+# The one Notion client for the whole app; import it rather than building
+# another, so every module shares its connection pool.
+notion = ThrottledNotionClient(auth=SETTINGS.notion_api_key)
+
+
+# Allocator columns the research pipeline reads (name, website/domain
+# discovery, the freshness check, and the fields Clay is sent). Fetching
+# only these keeps payloads small on a wide database.
+PIPELINE_PROPERTIES = (
+    "Name", "Firm Name", "Main Website", "Website", "Domain",
+    "Investments Page URL", "Latest Report URL", "Last Research Run",
+    "Org Type", "Total AUM", "Internal Notes", "Uses Consultants",
+    "Firm Type", "Type", "Location / Headquarters Location", "Location",
+)
+
+_property_ids = None
+_property_ids_lock = threading.Lock()
+
+
+def _allocator_property_ids(names) -> list:
+    """
+    Map property names to the IDs filter_properties expects, reading the
+    allocators database schema once. Returns [] (no filtering) if the
+    schema can't be read.
+    """
+    global _property_ids
+    with _property_ids_lock:
+        if _property_ids is None:
+            try:
+                schema = notion.databases.retrieve(database_id=SETTINGS.allocators_db_id)
+                # Schema IDs come URL-encoded; httpx encodes query params itself
+                _property_ids = {name: unquote(prop["id"]) for name, prop in schema["properties"].items()}
+            except Exception as e:
+                logger.warning(f"Could not read allocators schema, fetching all properties: {e}")
+                return []
+    return [_property_ids[name] for name in names if name in _property_ids]
+
+
+def get_allocator_record(page_id: str, properties=None):
+    """Retrieve an allocator page; pass property names to fetch only those."""
+    if properties:
+        property_ids = _allocator_property_ids(properties)
+        if property_ids:
+            return notion.pages.retrieve(page_id=page_id, filter_properties=property_ids)
     return notion.pages.retrieve(page_id=page_id)
 
 
@@ -12,15 +144,78 @@ def update_page_properties(page_id: str, props: dict):
     notion.pages.update(page_id=page_id, properties=props)
 
 
-def query_allocators_needing_research(limit=20):
-    resp = notion.databases.query(
-        database_id=SETTINGS.allocators_db_id,
-        filter={
-            "or": [
-                {"property": "Last Research Run", "date": {"is_empty": True}},
-                {"property": "Last Research Run", "date": {"before": "2023-01-01"}}
-            ]
-        },
-        page_size=limit
-    )
-    return resp["results"]
+class NotionWriteBatch:
+    """
+    Collect property updates for one page and send them as a single
+    pages.update. As a context manager it flushes on a clean exit.
+    """
+
+    def __init__(self, page_id: str):
+        self.page_id = page_id
+        self._props = {}
+
+    def set(self, name: str, value: dict):
+        self._props[name] = value
+
+    def __len__(self):
+        return len(self._props)
+
+    def flush(self):
+        """Send pending updates, if any. Returns True if a request was made."""
+        if not self._props:
+            return False
+        update_page_properties(self.page_id, self._props)
+        self._props = {}
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+
+# Notion caps a single databases.query page at 100 results.
+NOTION_MAX_PAGE_SIZE = 100
+
+
+def iter_allocators_needing_research(limit=None, properties=PIPELINE_PROPERTIES):
+    """
+    Yield allocator pages needing research, fetching the next Notion result
+    page only when the caller has consumed the current one. Pages carry the
+    given properties (all of them if properties is None), so callers never
+    need a follow-up pages.retrieve per allocator.
+    """
+    property_ids = _allocator_property_ids(properties) if properties else []
+    yielded = 0
+    cursor = None
+    while limit is None or yielded < limit:
+        page_size = NOTION_MAX_PAGE_SIZE if limit is None else min(limit - yielded, NOTION_MAX_PAGE_SIZE)
+        query = {
+            "database_id": SETTINGS.allocators_db_id,
+            "filter": {
+                "or": [
+                    {"property": "Last Research Run", "date": {"is_empty": True}},
+                    {"property": "Last Research Run", "date": {"before": "2023-01-01"}}
+                ]
+            },
+            "page_size": page_size,
+        }
+        if cursor:
+            query["start_cursor"] = cursor
+        if property_ids:
+            query["filter_properties"] = property_ids
+        resp = notion.databases.query(**query)
+        for page in resp["results"][:page_size]:
+            yield page
+            yielded += 1
+        if not resp.get("has_more"):
+            return
+        cursor = resp.get("next_cursor")
+
+
+def query_allocators_needing_research(limit=20, properties=PIPELINE_PROPERTIES):
+    """Return up to `limit` allocator pages needing research as a list."""
+    return list(iter_allocators_needing_research(limit, properties))
@@ -1,20 +1,82 @@
-from notion_client import Client
 from .config import SETTINGS
 from .contact_mapping_config import CONTACT_FIELD_CONFIG
-from .notion_mapping import build_notion_property
+from .notion_mapping import is_blank, resolve_fields
+from .notion_client import notion
+from .cache import TTLCache, MISSING
+from notion_client import APIResponseError, APIErrorCode
+import threading
 
-notion = Client(auth=SETTINGS.notion_api_key)
+_CONTACT_FIELDS = resolve_fields(CONTACT_FIELD_CONFIG)
+
+# A database's title property always has the ID "title"; asking for just
+# that keeps contact lookups from returning every column
+_TITLE_ONLY = ["title"]
+
+# (allocator_id, normalized name) -> contact page id, or None for a known miss
+_CONTACT_IDS = TTLCache(maxsize=4096, ttl=300)
+
+
+# Clay Person ID -> contact page id, loaded on the first upsert that has one
+_CLAY_IDS = None
+_CLAY_IDS_LOCK = threading.Lock()
+
+
+def _clay_person_index() -> dict:
+    """Map every contact's Clay Person ID to its page id (one paginated scan)."""
+    global _CLAY_IDS
+    with _CLAY_IDS_LOCK:
+        if _CLAY_IDS is not None:
+            return _CLAY_IDS
+        index = {}
+        cursor = None
+        while True:
+            query = {
+                "database_id": SETTINGS.contacts_db_id,
+                "filter": {"property": "Clay Person ID", "rich_text": {"is_not_empty": True}},
+                "page_size": 100,
+            }
+            if cursor:
+                query["start_cursor"] = cursor
+            results = notion.databases.query(**query)
+            for page in results["results"]:
+                text = page.get("properties", {}).get("Clay Person ID", {}).get("rich_text", [])
+                clay_id = "".join(t.get("plain_text", "") for t in text)
+                if clay_id:
+                    index.setdefault(clay_id, page["id"])
+            if not results.get("has_more"):
+                break
+            cursor = results.get("next_cursor")
+        _CLAY_IDS = index
+        return index
+
+
+def _contact_key(allocator_id: str, name: str) -> tuple:
+    return allocator_id, name.strip().lower()
 
 
 def find_contact(allocator_id: str, name: str):
+    key = _contact_key(allocator_id, name)
+    cached = _CONTACT_IDS.get(key)
+    if cached is not MISSING:
+        return cached
+    
+    contact_id = _query_contact(allocator_id, name)
+    _CONTACT_IDS.set(key, contact_id)
+    return contact_id
+
+
+def _contact_filter(allocator_id: str, name_condition: dict) -> dict:
+    """Contacts of one allocator matching name_condition."""
+    # A fresh literal is cheaper than deep-copying a template, and the SDK
+    # may still be encoding the previous filter on another thread
+    return {"and": [{"property": "Allocator", "relation": {"contains": allocator_id}}, name_condition]}
+
+
+def _query_contact(allocator_id: str, name: str):
     results = notion.databases.query(
         database_id=SETTINGS.contacts_db_id,
-        filter={
-            "and": [
-                {"property": "Allocator", "relation": {"contains": allocator_id}},
-                {"property": "Name", "title": {"equals": name}}
-            ]
-        }
+        filter=_contact_filter(allocator_id, {"property": "Name", "title": {"equals": name}}),
+        filter_properties=_TITLE_ONLY
     )
     if results["results"]:
         return results["results"][0]["id"]
@@ -26,7 +88,11 @@ def upsert_contact_for_allocator(allocator_id: str, contact_data: dict, clay_per
     if not name:
         return None
 
-    existing_id = find_contact(allocator_id, name)
+    clay_ids = _clay_person_index() if clay_person_id else None
+    # Clay IDs are stable and unique, so a hit skips the name query entirely
+    existing_id = clay_ids.get(clay_person_id) if clay_ids else None
+    if not existing_id:
+        existing_id = find_contact(allocator_id, name)
 
     properties = {
         "Allocator": {"relation": [{"id": allocator_id}]}
@@ -35,20 +101,41 @@ def upsert_contact_for_allocator(allocator_id: str, contact_data: dict, clay_per
     if clay_person_id:
         properties["Clay Person ID"] = {"rich_text": [{"text": {"content": clay_person_id}}]}
 
-    for key, cfg in CONTACT_FIELD_CONFIG.items():
-        notion_name = cfg["notion_name"]
-        field_type = cfg["type"]
-        value = contact_data.get(key)
-        prop = build_notion_property(field_type, value)
+    for key, value in contact_data.items():
+        field = _CONTACT_FIELDS.get(key)
+        # Skip blanks so we don't blank out what Notion already has
+        if field is None or is_blank(value):
+            continue
+        notion_name, build = field
+        prop = build(value)
         if prop:
             properties[notion_name] = prop
 
-    if existing_id:
-        notion.pages.update(page_id=existing_id, properties=properties)
+    if existing_id and set(properties) == {"Allocator"}:
+        # Found via the Allocator relation, so there is nothing to change
         return existing_id
-    else:
-        page = notion.pages.create(
-            parent={"database_id": SETTINGS.contacts_db_id},
-            properties=properties
-        )
-        return page["id"]
+
+    if existing_id:
+        try:
+            notion.pages.update(page_id=existing_id, properties=properties)
+            return existing_id
+        except APIResponseError as e:
+            if e.code != APIErrorCode.ObjectNotFound:
+                raise
+            # Cached id went stale (page deleted); look it up once more
+            _CONTACT_IDS.pop(_contact_key(allocator_id, name))
+            if clay_ids:
+                clay_ids.pop(clay_person_id, None)
+            existing_id = find_contact(allocator_id, name)
+            if existing_id:
+                notion.pages.update(page_id=existing_id, properties=properties)
+                return existing_id
+    
+    page = notion.pages.create(
+        parent={"database_id": SETTINGS.contacts_db_id},
+        properties=properties
+    )
+    _CONTACT_IDS.set(_contact_key(allocator_id, name), page["id"])
+    if clay_ids is not None:
+        clay_ids[clay_person_id] = page["id"]
+    return page["id"]
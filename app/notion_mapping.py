@@ -1,34 +1,92 @@
+import functools
+import logging
+import operator
+
+logger = logging.getLogger(__name__)
+
+
+# Notion rejects a text object longer than 2000 characters; longer values
+# are sent as consecutive text objects
+NOTION_TEXT_LIMIT = 2000
+
+_warned_types = set()
+
+
+def _text_objects(value) -> list:
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= NOTION_TEXT_LIMIT:
+        return [{"text": {"content": text}}]
+    return [{"text": {"content": text[i:i + NOTION_TEXT_LIMIT]}} for i in range(0, len(text), NOTION_TEXT_LIMIT)]
+
+
+def _multi_select(value):
+    if not isinstance(value, list):
+        return None
+    return {"multi_select": [{"name": str(v)} for v in value]}
+
+
+# Notion property type -> builder(value)
+_BUILDERS = {
+    "title": lambda v: {"title": _text_objects(v)},
+    "rich_text": lambda v: {"rich_text": _text_objects(v)},
+    "number": lambda v: {"number": float(v)},
+    "select": lambda v: {"select": {"name": str(v)}},
+    "multi_select": _multi_select,
+    "url": lambda v: {"url": str(v)},
+    "email": lambda v: {"email": str(v)},
+    "phone": lambda v: {"phone_number": str(v)},
+    "checkbox": lambda v: {"checkbox": operator.truth(v)},
+}
+
+
+def is_blank(value) -> bool:
+    """True for values not worth writing: None, empty/whitespace str, empty list."""
+    if value is None or value == []:
+        return True
+    return isinstance(value, str) and not value.strip()
+
+
 def build_notion_property(field_type: str, value):
     if value is None:
         return None
+    builder = _BUILDERS.get(field_type)
+    if builder is None:
+        # A config typo; say so once rather than writing a mistyped property
+        if field_type not in _warned_types:
+            _warned_types.add(field_type)
+            logger.warning(f"No Notion property builder for type {field_type!r}; skipping")
+        return None
+    return builder(value)
 
-    if field_type == "title":
-        return {"title": [{"text": {"content": str(value)}}]}
-
-    if field_type == "rich_text":
-        return {"rich_text": [{"text": {"content": str(value)}}]}
 
-    if field_type == "number":
-        return {"number": float(value)}
+def resolve_fields(config: dict) -> dict:
+    """
+    Flatten a *_FIELD_CONFIG into {key: (notion_name, builder)} once, so
+    write loops can walk their input and skip per-field config lookups.
+    """
+    return {
+        key: (cfg["notion_name"], _BUILDERS.get(cfg["type"]) or functools.partial(build_notion_property, cfg["type"]))
+        for key, cfg in config.items()
+    }
 
-    if field_type == "select":
-        return {"select": {"name": str(value)}}
 
-    if field_type == "multi_select":
-        if not isinstance(value, list):
-            return None
-        return {"multi_select": [{"name": str(v)} for v in value]}
+def read_notion_property(prop: dict):
+    """Inverse of build_notion_property: plain Python value from a page property."""
+    field_type = prop.get("type")
+    value = prop.get(field_type)
+    if value is None:
+        return None
 
-    if field_type == "url":
-        return {"url": str(value)}
+    if field_type in ("title", "rich_text"):
+        return "".join(part.get("plain_text", "") for part in value) or None
 
-    if field_type == "email":
-        return {"email": str(value)}
+    if field_type == "select":
+        return value.get("name")
 
-    if field_type == "phone":
-        return {"phone_number": str(value)}
+    if field_type == "multi_select":
+        return [option.get("name") for option in value]
 
-    if field_type == "checkbox":
-        return {"checkbox": bool(value)}
+    if field_type == "date":
+        return value.get("start")
 
-    return {"rich_text": [{"text": {"content": str(value)}}]}
+    return value
@@ -1,44 +1,76 @@
-from notion_client import Client
 from .config import SETTINGS
 from .mapping_config import ALLOCATOR_FIELD_CONFIG
-from .notion_mapping import build_notion_property
+from .notion_mapping import is_blank, read_notion_property, resolve_fields
+from .notion_client import notion
+from .cache import TTLCache
 from datetime import datetime, timezone
+import hashlib
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
-notion = Client(auth=SETTINGS.notion_api_key)
+_ALLOCATOR_FIELDS = resolve_fields(ALLOCATOR_FIELD_CONFIG)
+
+# page_id -> hash of the enriched properties last written. Entries live an
+# hour: an identical re-run inside that window sends only Last Research Run
+# instead of re-sending every field.
+_LAST_WRITTEN = TTLCache(maxsize=4096, ttl=3600)
+
+
+def profile_from_page(page: dict) -> dict:
+    """
+    Current allocator profile as stored in Notion, keyed like the LLM output,
+    plus last_research_run (ISO date string or None).
+    """
+    props = page.get("properties", {})
+    profile = {}
+    for key, cfg in ALLOCATOR_FIELD_CONFIG.items():
+        prop = props.get(cfg["notion_name"])
+        if prop:
+            profile[key] = read_notion_property(prop)
+
+    last_run = props.get("Last Research Run")
+    profile["last_research_run"] = read_notion_property(last_run) if last_run else None
+    return profile
 
 
 def update_allocator_from_llm(page_id: str, enriched: dict):
+    """Write the LLM output onto the allocator page."""
     properties = {}
 
-    for key, cfg in ALLOCATOR_FIELD_CONFIG.items():
-        if key not in enriched:
-            continue
-        
-        value = enriched.get(key)
-        if value is None or value == [] or value == "":
-            continue
+    # The per-field line is the hottest log here; only format it when DEBUG is on
+    log_fields = logger.isEnabledFor(logging.DEBUG)
 
-        notion_name = cfg["notion_name"]
-        field_type = cfg["type"]
+    # Walk the LLM output rather than the whole config; unknown keys are ignored
+    for key, value in enriched.items():
+        field = _ALLOCATOR_FIELDS.get(key)
+        if field is None or is_blank(value):
+            continue
+        notion_name, build = field
 
-        prop = build_notion_property(field_type, value)
+        prop = build(value)
         if prop:
             properties[notion_name] = prop
-            logger.info(f"Mapping {key} -> {notion_name}: {value}")
+            if log_fields:
+                logger.debug("Mapping %s -> %s: %s", key, notion_name, value)
+
+    digest = hashlib.blake2b(orjson.dumps(properties, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+    if _LAST_WRITTEN.get(page_id, None) == digest:
+        # Same fields as our last write to this page; just record the run
+        logger.info("No field changes for %s since its last update, only stamping Last Research Run", page_id)
+        properties = {}
 
     # ALWAYS set Last Research Run to now
     now_iso = datetime.now(timezone.utc).isoformat()
     properties["Last Research Run"] = {"date": {"start": now_iso}}
     
-    logger.info(f"Updating Notion page {page_id} with {len(properties)} properties: {list(properties.keys())}")
+    logger.info("Updating Notion page %s with %d properties: %s", page_id, len(properties), properties.keys())
     
-    if properties:
-        try:
-            notion.pages.update(page_id=page_id, properties=properties)
-            logger.info(f"Successfully updated {page_id}")
-        except Exception as e:
-            logger.error(f"Notion update failed: {e}")
-            raise
+    try:
+        notion.pages.update(page_id=page_id, properties=properties)
+        _LAST_WRITTEN.set(page_id, digest)
+        logger.info("Successfully updated %s", page_id)
+    except Exception as e:
+        logger.error("Notion update failed: %s", e)
+        raise
@@ -0,0 +1,96 @@
+"""
+Retry helper for outbound HTTP calls.
+
+Retries transient failures (rate limits, gateway errors) with exponential
+backoff plus jitter, honouring Retry-After when the server sends one.
+"""
+
+import logging
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _retry_after_seconds(response: httpx.Response):
+    """Parse a numeric Retry-After header; returns None if absent/unparseable."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """
+    True for failures worth retrying: rate limits, gateway/server errors,
+    timeouts and dropped connections. Other 4xx responses (bad request,
+    auth) would fail identically on every attempt.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (httpx.TimeoutException, httpx.ConnectError, httpx.RemoteProtocolError))
+
+
+def is_unsent_error(exc: Exception) -> bool:
+    """
+    True only for failures where the server can't have acted on the request:
+    a 429, or a connection that was never established. The retry policy for
+    non-idempotent calls (creating something billable), where a timeout or
+    5xx may have been committed server-side.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429
+    return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def retry_call(fn, max_retries: int = 4, base: float = 1.0, max_delay: float = 30.0, retryable=is_retryable_error):
+    """
+    Call fn() and retry the httpx errors `retryable` accepts
+    (is_retryable_error() by default).
+    fn is responsible for raising HTTPStatusError itself; use this when the
+    request is consumed inside fn (e.g. a streamed response).
+    
+    Returns fn()'s result; re-raises the last error once retries are
+    exhausted or the error is terminal.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except httpx.HTTPError as e:
+            if not retryable(e) or attempt >= max_retries:
+                raise
+            delay = None
+            if isinstance(e, httpx.HTTPStatusError):
+                delay = _retry_after_seconds(e.response)
+            if delay is None:
+                delay = base * 2 ** attempt + random.random() * 0.5
+            delay = min(max_delay, delay)
+            logger.warning(f"{type(e).__name__} calling {e.request.url}, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            attempt += 1
+
+
+def retry_http(fn, max_retries: int = 4, base: float = 1.0, max_delay: float = 30.0, retryable=is_retryable_error) -> httpx.Response:
+    """
+    Call fn() (which performs one HTTP request and returns the response),
+    raise for HTTP errors and retry those `retryable` accepts
+    (is_retryable_error() by default).
+    Terminal errors are raised immediately.
+    
+    Returns the successful response; re-raises the last error once
+    retries are exhausted or the status is not retryable.
+    """
+    def checked():
+        response = fn()
+        response.raise_for_status()
+        return response
+    
+    return retry_call(checked, max_retries=max_retries, base=base, max_delay=max_delay, retryable=retryable)
@@ -1,28 +1,96 @@
-from notion_client import Client
 from .config import SETTINGS
+from .notion_client import notion
+import atexit
 import logging
+import orjson
+import queue
+import threading
 
 logger = logging.getLogger(__name__)
 
-notion = Client(auth=SETTINGS.notion_api_key)
+# Snapshots are telemetry: callers enqueue and a single background worker
+# writes them to Notion, keeping the Notion round trip off the pipeline.
+# The queue is bounded so a Notion outage can't grow memory without limit;
+# beyond that, snapshots are dropped and counted.
+SNAPSHOT_QUEUE_MAXSIZE = 1024
+_SNAPSHOT_Q = queue.Queue(maxsize=SNAPSHOT_QUEUE_MAXSIZE)
+_worker_lock = threading.Lock()
+_worker = None
+dropped_snapshots = 0
 
 
-def log_snapshot(allocator_id: str, status: str, input_sources: dict, summary: str, raw_json: dict, error: str = None):
-    if not SETTINGS.snapshots_db_id:
-        logger.info(f"Snapshot logging skipped (no SNAPSHOTS_DB_ID): {status} for {allocator_id}")
+def _snapshot_worker():
+    while True:
+        args, kwargs = _SNAPSHOT_Q.get()
+        try:
+            _write_snapshot(*args, **kwargs)
+        finally:
+            _SNAPSHOT_Q.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
         return
-    
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_snapshot_worker, name="snapshot-writer", daemon=True)
+            _worker.start()
+
+
+def _capped_json(obj, limit: int) -> str:
+    """
+    JSON text of obj cut to `limit` chars. Only the first limit*4 bytes
+    (the UTF-8 worst case) are decoded; a split multi-byte char is dropped.
+    Callers that log the same blob repeatedly can pass it pre-encoded as
+    bytes (or str) to skip the dump.
+    """
+    if isinstance(obj, str):
+        return obj[:limit]
+    data = obj if isinstance(obj, bytes) else orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return data[:limit * 4].decode("utf-8", "ignore")[:limit]
+
+
+def _write_snapshot(allocator_id: str, status: str, input_sources, summary: str, raw_json, error: str = None):
     try:
         notion.pages.create(
             parent={"database_id": SETTINGS.snapshots_db_id},
             properties={
                 "Allocator": {"relation": [{"id": allocator_id}]},
                 "Status": {"select": {"name": status}},
-                "Input Sources": {"rich_text": [{"text": {"content": str(input_sources)[:2000]}}]},
+                "Input Sources": {"rich_text": [{"text": {"content": _capped_json(input_sources, 2000)}}]},
                 "Extracted Summary": {"rich_text": [{"text": {"content": (summary or "")[:2000]}}]},
-                "Raw LLM JSON": {"rich_text": [{"text": {"content": str(raw_json)[:1800]}}]},
+                "Raw LLM JSON": {"rich_text": [{"text": {"content": _capped_json(raw_json, 1800)}}]},
                 "Error Message": {"rich_text": [{"text": {"content": (error or "")[:2000]}}]}
             }
         )
     except Exception as e:
         logger.warning(f"Failed to log snapshot: {e}")
+
+
+def log_snapshot(allocator_id: str, status: str, input_sources, summary: str, raw_json, error: str = None):
+    """
+    Queue a snapshot write. input_sources and raw_json may be dicts or
+    JSON already encoded to bytes/str.
+    """
+    if not SETTINGS.snapshots_db_id:
+        logger.info(f"Snapshot logging skipped (no SNAPSHOTS_DB_ID): {status} for {allocator_id}")
+        return
+    
+    global dropped_snapshots
+    _ensure_worker()
+    try:
+        _SNAPSHOT_Q.put_nowait(((allocator_id, status, input_sources, summary, raw_json), {"error": error}))
+    except queue.Full:
+        with _worker_lock:
+            dropped_snapshots += 1
+        logger.warning(f"Snapshot queue full, dropped {status} snapshot for {allocator_id} ({dropped_snapshots} dropped so far)")
+
+
+def flush_snapshots():
+    """Block until every queued snapshot has been written."""
+    if _worker is not None:
+        _SNAPSHOT_Q.join()
+
+
+atexit.register(flush_snapshots)
@@ -0,0 +1,97 @@
+"""
+Rate limiting for outbound API calls.
+"""
+
+import contextlib
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .retry import _retry_after_seconds
+
+
+class TokenBucket:
+    """
+    Blocking token bucket: acquire() returns once a token is available,
+    smoothing callers to `rate` requests/second with bursts up to `capacity`.
+    Safe to share between threads.
+    """
+
+    def __init__(self, rate: float = 3, capacity: float = 3):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _HostState:
+    __slots__ = ("slots", "next_at", "backoff")
+
+    def __init__(self, max_concurrent: int):
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.next_at = 0.0
+        self.backoff = 0.0
+
+
+class HostLimiter:
+    """
+    Per-host politeness for crawling: at most `max_concurrent` requests in
+    flight per host, request starts spaced at least `min_interval` seconds
+    apart, and a pause when a host signals rate limiting (429, Retry-After,
+    X-RateLimit-Remaining: 0) that doubles while it keeps doing so.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_concurrent: int = 4, min_interval: float = 0.1, max_backoff: float = 60.0):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, url: str) -> _HostState:
+        host = urlsplit(url).netloc
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostState(self.max_concurrent)
+        return state
+
+    @contextlib.contextmanager
+    def slot(self, url: str):
+        """Hold one of url's host slots, waiting out spacing and back-off first."""
+        state = self._state(url)
+        with state.slots:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, state.next_at)
+                state.next_at = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+    def observe(self, url: str, response):
+        """Record a response from url's host, backing off if it asks us to."""
+        limited = response.status_code == 429 or response.headers.get("x-ratelimit-remaining") == "0"
+        state = self._state(url)
+        with self._lock:
+            if not limited:
+                state.backoff = 0.0
+                return
+            delay = _retry_after_seconds(response)
+            if delay is None:
+                delay = state.backoff = min(self.max_backoff, max(1.0, state.backoff * 2))
+            state.next_at = max(state.next_at, time.monotonic() + min(delay, self.max_backoff))
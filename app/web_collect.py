@@ -10,77 +10,477 @@ Scrapes allocator websites to extract relevant text from:
 Supports both HTML and PDF extraction with intelligent page targeting.
 """
 
+import os
 import re
+import atexit
+import functools
+import hashlib
 import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
 
 import httpx
-import trafilatura
+import orjson
+from lxml import etree
+from lxml import html as lxml_html
+
+from .cache import MISSING, DiskCache, TTLCache
+from .config import SETTINGS
+from .throttle import HostLimiter
 
 logger = logging.getLogger(__name__)
 
-# Try pdfplumber first (better for tables), fall back to pypdf
-try:
-    import pdfplumber
-    PDF_EXTRACTOR = "pdfplumber"
-except ImportError:
-    pdfplumber = None
-    PDF_EXTRACTOR = "pypdf"
+# Parsers are imported on first use: pdfplumber (pdfminer, PIL), pypdf and
+# trafilatura add hundreds of ms and tens of MB to every process that merely
+# imports this module. Preference order for PDFs is pypdfium2 (C-backed
+# PDFium, much faster for prose), then pdfplumber (better for tables), then
+# pypdf.
+
+@functools.cache
+def _pdfium():
+    """pypdfium2, or None if not installed."""
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    return pypdfium2
 
-from pypdf import PdfReader
 
+@functools.cache
+def _pdfplumber():
+    """pdfplumber, or None if not installed."""
+    try:
+        import pdfplumber
+    except ImportError:
+        return None
+    return pdfplumber
+
+
+@functools.cache
+def _trafilatura():
+    import trafilatura
+    return trafilatura
+
+
+@functools.cache
+def _resiliparse():
+    """resiliparse's html2text/encoding helpers, or None if not installed."""
+    try:
+        from resiliparse.extract import html2text
+        from resiliparse.parse import encoding
+    except ImportError:
+        return None
+    return html2text, encoding
 
-DEFAULT_TIMEOUT = 20  # increased for large PDFs
+
+# Unreachable hosts fail fast on connect; the long read budget is for large PDFs
+DEFAULT_TIMEOUT = httpx.Timeout(connect=3.0, read=15.0, write=5.0, pool=5.0)
 MAX_TEXT_CHARS = 25000  # per bucket for about/policy
 MAX_REPORT_TEXT_CHARS = 50000  # larger limit for report_text (PDF content)
 MAX_URLS_PER_BUCKET = 10
 MAX_PDF_SIZE_MB = 50  # skip PDFs larger than this
+MAX_PDFS = 3  # PDFs fetched per allocator, best-ranked first
+
+# Shared pooled client so fetches reuse TCP/TLS connections across URLs and
+# allocators (httpx.Client is thread-safe)
+_HTTP = httpx.Client(
+    follow_redirects=True,
+    timeout=DEFAULT_TIMEOUT,
+    http2=True,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+)
+atexit.register(_HTTP.close)
+
+# Optional on-disk caches (WEB_CACHE_DIR): raw responses (reused outright
+# while fresh, then revalidated with ETag/Last-Modified), and extracted
+# PDF/HTML text keyed by a hash of the body, so the same document served
+# from several URLs is parsed once
+WEB_CACHE_MAX_PAGES = 500
+WEB_CACHE_MAX_PDF_TEXTS = 2000
+WEB_CACHE_MAX_HTML_TEXTS = 5000
+WEB_CACHE_FRESH_SECONDS = 6 * 3600
+if SETTINGS.web_cache_dir:
+    _PAGE_CACHE = DiskCache(os.path.join(SETTINGS.web_cache_dir, "pages"), WEB_CACHE_MAX_PAGES, suffix=".bin")
+    _PDF_TEXT_CACHE = DiskCache(os.path.join(SETTINGS.web_cache_dir, "pdf_text"), WEB_CACHE_MAX_PDF_TEXTS, suffix=".txt")
+    _HTML_TEXT_CACHE = DiskCache(os.path.join(SETTINGS.web_cache_dir, "html_text"), WEB_CACHE_MAX_HTML_TEXTS, suffix=".txt")
+else:
+    _PAGE_CACHE = _PDF_TEXT_CACHE = _HTML_TEXT_CACHE = None
+
+# Probe outcomes per host, {path: [live, checked_at, ttl]}, so later crawls
+# skip guessed paths already known to 404 (and the HEAD for ones known to
+# work). Refusals (403 and other 4xx) may be a WAF or a passing block, so
+# they are only remembered briefly. Kept in memory, and on disk too when
+# WEB_CACHE_DIR is set.
+PATH_HISTORY_TTL = 30 * 24 * 3600
+PATH_REFUSED_TTL = 6 * 3600
+_PATH_HISTORY = TTLCache(maxsize=4096, ttl=PATH_HISTORY_TTL)
+_PATH_HISTORY_DISK = DiskCache(os.path.join(SETTINGS.web_cache_dir, "paths-v2")) if SETTINGS.web_cache_dir else None
+
+# Parsed robots.txt per site origin (None: no usable robots.txt, allow all)
+ROBOTS_TTL = 24 * 3600
+_ROBOTS = TTLCache(maxsize=1024, ttl=ROBOTS_TTL)
+
+# Fetch workers shared by every collect_web_text call; bounds total
+# in-flight page fetches no matter how many allocators run at once
+MAX_FETCH_WORKERS = 16
+_FETCH_POOL = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS, thread_name_prefix="web-fetch")
+
+# ...and no single allocator site gets more than this many at once, spaced
+# out and backed off when it pushes back, so a burst of guessed paths
+# doesn't trip its rate limiting
+MAX_FETCHES_PER_HOST = 4
+MIN_HOST_INTERVAL = 0.1
+_HOST_LIMITER = HostLimiter(MAX_FETCHES_PER_HOST, MIN_HOST_INTERVAL)
 
 
 # ----- 1. Helper: safe HTTP fetch ----- #
 
+def _cache_key(*parts) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for data in parts:
+        digest.update(data.encode("utf-8") if isinstance(data, str) else data)
+    return digest.hexdigest()
+
+
+def _cached_text(cache, key: str):
+    """Extracted text stored under key, or None (also when caching is off)."""
+    if cache is None:
+        return None
+    blob = cache.get(key)
+    return None if blob is None else blob.decode("utf-8")
+
+
+def _store_text(cache, key: str, text: str):
+    if cache is None:
+        return
+    try:
+        cache.set(key, text.encode("utf-8"))
+    except OSError as e:
+        logger.debug(f"Failed to cache extracted text: {e}")
+
+
+def _load_cached_page(url: str):
+    """Return (meta, body_bytes) for a cached response, or None."""
+    if _PAGE_CACHE is None:
+        return None
+    blob = _PAGE_CACHE.get(_cache_key(url))
+    if not blob:
+        return None
+    meta, _, body = blob.partition(b"\n")
+    try:
+        return orjson.loads(meta), body
+    except orjson.JSONDecodeError:
+        return None
+
+
+def _store_cached_page(url: str, resp: httpx.Response, body: bytes):
+    if _PAGE_CACHE is None:
+        return
+    meta = orjson.dumps({
+        "etag": resp.headers.get("etag"),
+        "last_modified": resp.headers.get("last-modified"),
+        "content_type": resp.headers.get("content-type", ""),
+        "fetched_at": time.time(),
+    })
+    try:
+        _PAGE_CACHE.set(_cache_key(url), meta + b"\n" + body)
+    except OSError as e:
+        logger.debug(f"Failed to cache {url}: {e}")
+
+
+MAX_BODY_BYTES = MAX_PDF_SIZE_MB * 1024 * 1024
+# HTML parses fine when cut short and only MAX_TEXT_CHARS of it is kept,
+# so pages are truncated here rather than read in full
+MAX_HTML_BYTES = 2 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _read_capped(url: str, resp: httpx.Response):
+    """
+    Read a streamed body without buffering more than we can use. PDFs
+    need their trailer to parse, so one past MAX_BODY_BYTES is dropped
+    (None), even when the server omits or understates Content-Length;
+    anything else is truncated at MAX_HTML_BYTES.
+    """
+    content_type = resp.headers.get("content-type", "").lower()
+    is_pdf = "pdf" in content_type or url.lower().endswith(".pdf")
+    limit = MAX_BODY_BYTES if is_pdf else MAX_HTML_BYTES
+    # BytesIO hands back its buffer without a final copy
+    buf = BytesIO()
+    for chunk in resp.iter_bytes(STREAM_CHUNK_BYTES):
+        buf.write(chunk)
+        if buf.tell() > limit:
+            if is_pdf:
+                logger.warning(f"Response too large (>{MAX_PDF_SIZE_MB}MB), skipping: {url}")
+                return None
+            logger.debug(f"Truncating page at {limit} bytes: {url}")
+            buf.truncate(limit)
+            break
+    return buf.getvalue()
+
+
 def safe_get(url: str) -> tuple:
     """
-    Fetch a URL and return (content_type, raw_bytes or text).
-    Returns ("", "") on failure.
+    Fetch a URL and return (content_type, raw_bytes). Bodies are left
+    undecoded; see _html_body. Returns ("", b"") on failure.
     """
     if not url:
-        return "", ""
+        return "", b""
+
+    cached = _load_cached_page(url)
+    headers = {}
+    if cached:
+        meta, body = cached
+        if time.time() - meta.get("fetched_at", 0) < WEB_CACHE_FRESH_SECONDS:
+            return meta.get("content_type", "").lower(), body
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
 
     try:
-        with httpx.Client(follow_redirects=True, timeout=DEFAULT_TIMEOUT) as client:
-            # First do a HEAD request to check size for PDFs
-            if url.lower().endswith(".pdf"):
-                try:
-                    head = client.head(url)
-                    content_length = int(head.headers.get("content-length", 0))
-                    if content_length > MAX_PDF_SIZE_MB * 1024 * 1024:
-                        logger.warning(f"PDF too large ({content_length / 1024 / 1024:.1f}MB): {url}")
-                        return "", ""
-                except Exception:
-                    pass  # Continue anyway if HEAD fails
-            
-            resp = client.get(url)
-        if resp.status_code != 200:
-            return "", ""
-
-        content_type = resp.headers.get("content-type", "").lower()
-        is_pdf = "pdf" in content_type or url.lower().endswith(".pdf")
-        return content_type, resp.content if is_pdf else resp.text
+        with _HOST_LIMITER.slot(url), _HTTP.stream("GET", url, headers=headers) as resp:
+            _HOST_LIMITER.observe(url, resp)
+            if resp.status_code == 304 and cached:
+                meta, body = cached
+                return meta.get("content_type", "").lower(), body
+            if resp.status_code != 200:
+                return "", b""
+            body = _read_capped(url, resp)
+            if body is None:
+                return "", b""
+
+        _store_cached_page(url, resp, body)
+        return resp.headers.get("content-type", "").lower(), body
     except Exception as e:
         logger.debug(f"Failed to fetch {url}: {e}")
-        return "", ""
+        return "", b""
+
+
+def _probe(url: str) -> tuple:
+    """
+    Cheap liveness check before a full GET: HEAD the URL (falling back to
+    fetching a single byte when HEAD is unsupported or refused) and reject
+    errors and oversized PDFs.
+    Returns (live, ttl): live is True/False, or None when the failure may
+    be transient; ttl is how long the outcome may be remembered.
+    """
+    try:
+        with _HOST_LIMITER.slot(url):
+            resp = _HTTP.head(url)
+        # Many CDNs/WAFs answer HEAD from non-browser clients with 400/401/403
+        # while GET works, so only 404/410 are taken at their word
+        if resp.status_code in (405, 501) or (400 <= resp.status_code < 500 and resp.status_code not in (404, 410, 429)):
+            with _HOST_LIMITER.slot(url):
+                resp = _HTTP.get(url, headers={"Range": "bytes=0-0"})
+        _HOST_LIMITER.observe(url, resp)
+    except Exception as e:
+        logger.debug(f"Probe failed for {url}: {e}")
+        return None, 0
+    if resp.status_code == 429 or resp.status_code >= 500:
+        return None, 0
+    if resp.status_code in (404, 410):
+        return False, PATH_HISTORY_TTL
+    if resp.status_code >= 400:
+        return False, PATH_REFUSED_TTL
+
+    # Only pages and PDFs are worth a GET (no content-type: give it a chance)
+    content_type = resp.headers.get("content-type", "").lower()
+    is_pdf_url = url.lower().endswith(".pdf")
+    if content_type and "html" not in content_type and "pdf" not in content_type and not is_pdf_url:
+        return False, PATH_HISTORY_TTL
+
+    if is_pdf_url:
+        try:
+            content_length = int(resp.headers.get("content-length", 0))
+        except ValueError:
+            content_length = 0
+        # A ranged GET's Content-Length is the one byte; Content-Range has the total
+        content_range = resp.headers.get("content-range", "")
+        if resp.status_code == 206 and "/" in content_range:
+            try:
+                content_length = int(content_range.rsplit("/", 1)[1])
+            except ValueError:
+                content_length = 0
+        if content_length > MAX_BODY_BYTES:
+            logger.warning(f"PDF too large ({content_length / 1024 / 1024:.1f}MB): {url}")
+            return False, PATH_HISTORY_TTL
+    return True, PATH_HISTORY_TTL
+
+
+def _load_path_history(host: str) -> dict:
+    history = _PATH_HISTORY.get(host, None)
+    if history is None and _PATH_HISTORY_DISK is not None:
+        blob = _PATH_HISTORY_DISK.get(_cache_key(host))
+        if blob:
+            try:
+                history = orjson.loads(blob)
+            except orjson.JSONDecodeError:
+                history = None
+    return history or {}
+
+
+def _save_path_history(host: str, history: dict):
+    _PATH_HISTORY.set(host, history)
+    if _PATH_HISTORY_DISK is not None:
+        try:
+            _PATH_HISTORY_DISK.set(_cache_key(host), orjson.dumps(history))
+        except OSError as e:
+            logger.debug(f"Failed to save path history for {host}: {e}")
+
+
+def _robots(origin: str):
+    """Parsed robots.txt for a scheme://host origin, fetched once per ROBOTS_TTL."""
+    parser = _ROBOTS.get(origin)
+    if parser is not MISSING:
+        return parser
+    parser = None
+    try:
+        with _HOST_LIMITER.slot(origin):
+            resp = _HTTP.get(f"{origin}/robots.txt")
+        _HOST_LIMITER.observe(origin, resp)
+        # Missing or erroring robots.txt means no restrictions; an HTML
+        # page here is a catch-all route, not a robots file
+        if resp.status_code == 200 and "html" not in resp.headers.get("content-type", ""):
+            parser = RobotFileParser()
+            parser.parse(resp.text.splitlines())
+    except Exception as e:
+        logger.debug(f"Failed to fetch robots.txt for {origin}: {e}")
+    _ROBOTS.set(origin, parser)
+    return parser
+
+
+def _robots_allowed(urls: list) -> list:
+    """Drop URLs their site's robots.txt disallows, fetching each robots.txt once."""
+    origins = {}
+    for url in urls:
+        parts = urlsplit(url)
+        origins.setdefault(url, f"{parts.scheme}://{parts.netloc}")
+    unique_origins = list(dict.fromkeys(origins.values()))
+    parsers = dict(zip(unique_origins, _FETCH_POOL.map(_robots, unique_origins)))
+    allowed = []
+    for url in urls:
+        parser = parsers[origins[url]]
+        if parser is None or parser.can_fetch("*", url):
+            allowed.append(url)
+        else:
+            logger.debug(f"Disallowed by robots.txt: {url}")
+    return allowed
+
+
+def probe_urls(urls: list) -> list:
+    """
+    Probe URLs concurrently and keep the live ones, in order. URLs their
+    site's robots.txt disallows are dropped unprobed, and paths with a
+    recent definite outcome for their host are answered from history.
+    """
+    urls = _robots_allowed(urls)
+    now = time.time()
+    histories = {}
+    known = {}
+    to_probe = []
+    for url in urls:
+        parts = urlsplit(url)
+        if parts.netloc not in histories:
+            histories[parts.netloc] = _load_path_history(parts.netloc)
+        entry = histories[parts.netloc].get(parts.path)
+        if entry and now - entry[1] < entry[2]:
+            known[url] = entry[0]
+        else:
+            to_probe.append(url)
+    
+    changed = set()
+    for url, (ok, ttl) in zip(to_probe, _FETCH_POOL.map(_probe, to_probe)):
+        known[url] = bool(ok)
+        if ok is not None:
+            parts = urlsplit(url)
+            histories[parts.netloc][parts.path] = [ok, now, ttl]
+            changed.add(parts.netloc)
+    for host in changed:
+        _save_path_history(host, histories[host])
+    
+    if len(to_probe) < len(urls):
+        logger.info(f"Probed {len(to_probe)} of {len(urls)} URLs, rest known from path history")
+    return [url for url in urls if known[url]]
 
 
 # ----- 2. Helper: extract text from HTML ----- #
 
-def extract_text_from_html(html: str) -> str:
-    """Extract clean text from HTML using trafilatura."""
-    if not html:
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)")
+_UTF8_NAMES = {"utf-8", "utf8"}
+
+
+def _html_body(content_type: str, body: bytes):
+    """
+    Prepare a non-PDF response body for trafilatura, or return None when it
+    plainly isn't markup (JSON, plain text, binary). The body stays bytes so
+    trafilatura detects the encoding itself, unless the server declared a
+    non-UTF-8 charset that a <meta> tag might not repeat.
+    """
+    # Skip a UTF-8 BOM and leading whitespace; markup starts with "<"
+    if body[:1024].lstrip(b" \t\r\n\xef\xbb\xbf")[:1] != b"<":
+        return None
+    match = _CHARSET_RE.search(content_type)
+    if match and match.group(1).lower() not in _UTF8_NAMES:
+        try:
+            return body.decode(match.group(1), errors="replace")
+        except LookupError:
+            pass
+    return body
+
+
+# Below this, a resiliparse extraction probably missed the main content
+MIN_RESILIPARSE_CHARS = 100
+# Pages this small hold a line or two at most; not worth an extractor
+TINY_HTML_BYTES = 1024
+
+
+def _extract_with_resiliparse(html) -> str:
+    html2text, encoding = _resiliparse()
+    if isinstance(html, bytes):
+        html = encoding.bytes_to_str(html, encoding.detect_encoding(html))
+    return html2text.extract_plain_text(html, main_content=True, alt_texts=False, comments=False)
+
+
+def _plain_text(html) -> str:
+    tree = _parse_html(html)
+    if tree is None:
         return ""
+    etree.strip_elements(tree, "script", "style", with_tail=False)
+    return " ".join(tree.text_content().split())
+
+
+def extract_text_from_html(html) -> str:
+    """
+    Extract clean text from HTML (str, bytes or an already parsed lxml
+    tree). Uses resiliparse (C++, several times faster) when installed,
+    falling back to trafilatura for trees and for pages where it finds
+    next to nothing. Input past MAX_HTML_BYTES is cut off, and tiny pages
+    skip the extractors.
+    """
+    if html is None or isinstance(html, (str, bytes)) and not html:
+        return ""
+    if isinstance(html, (str, bytes)):
+        if len(html) > MAX_HTML_BYTES:
+            html = html[:MAX_HTML_BYTES]
+        elif len(html) < TINY_HTML_BYTES:
+            return _plain_text(html)
+    if _resiliparse() and isinstance(html, (str, bytes)):
+        try:
+            extracted = _extract_with_resiliparse(html)
+            if len(extracted) >= MIN_RESILIPARSE_CHARS:
+                return extracted
+        except Exception as e:
+            logger.debug(f"resiliparse extraction failed: {e}")
     try:
-        extracted = trafilatura.extract(html, include_comments=False)
+        # fast: skip the readability/jusText fallback passes
+        extracted = _trafilatura().extract(html, include_comments=False, fast=True)
         return extracted or ""
     except Exception:
         return ""
@@ -117,30 +517,42 @@ HIGH_VALUE_KEYWORDS = [
 ]
 
 
+# Each keyword counts once per page: section markers weigh 5, others 1
+_RELEVANCE_WEIGHTS = tuple(
+    [(marker, 5) for marker in INVESTMENT_SECTION_MARKERS] + [(kw, 1) for kw in HIGH_VALUE_KEYWORDS]
+)
+
+# Headers that open the Investment Section itself (fallback when no TOC entry)
+_SECTION_HEADER_MARKERS = (
+    "investment section",
+    "report from the chief investment officer",
+    "report of the chief investment officer",
+    "chief investment officer's report",
+)
+
+
 def _score_page_relevance(text: str) -> int:
     """Score a page's relevance based on investment keywords."""
     if not text:
         return 0
     text_lower = text.lower()
-    score = 0
-    
-    # High score for investment section markers
-    for marker in INVESTMENT_SECTION_MARKERS:
-        if marker in text_lower:
-            score += 5
-    
-    # Regular score for other keywords
-    for kw in HIGH_VALUE_KEYWORDS:
-        if kw in text_lower:
-            score += 1
-    
-    return score
+    return sum(weight for kw, weight in _RELEVANCE_WEIGHTS if kw in text_lower)
+
 
+# TOC entries in CAFRs: a section title followed by its page number. Checked
+# in order, so an "investment section" entry wins over a later-listed one.
+_TOC_PATTERNS = tuple(re.compile(p) for p in (
+    r'investment\s+section[.\s]*(\d+)',
+    r'report.*chief investment officer[.\s]*(\d+)',
+    r'cio\s+report[.\s]*(\d+)',
+    r'investment\s+overview[.\s]*(\d+)',
+))
 
-def _find_investment_section_pages(pdf, total_pages: int) -> tuple[int, int]:
+
+def _find_investment_section_pages(page_text, total_pages: int) -> tuple[int, int]:
     """
-    Scan PDF to find the Investment Section page range.
-    Returns (start_page, end_page) or (None, None) if not found.
+    Scan PDF to find the Investment Section page range; page_text(i) returns
+    the text of page i. Returns (start_page, end_page) or (None, None) if not found.
     
     CAFRs typically have a Table of Contents in first 5-10 pages that lists:
     - Introductory Section
@@ -157,27 +569,13 @@ def _find_investment_section_pages(pdf, total_pages: int) -> tuple[int, int]:
     
     for i in range(toc_pages):
         try:
-            if hasattr(pdf, 'pages'):  # pdfplumber
-                text = pdf.pages[i].extract_text() or ""
-            else:  # pypdf
-                text = pdf.pages[i].extract_text() or ""
+            text = page_text(i)
             
             text_lower = text.lower()
             
             # Look for TOC entry like "Investment Section...45" or "Investment Section 45"
-            # Common patterns in CAFRs
-            import re
-            
-            # Pattern: "investment section" followed by page number
-            patterns = [
-                r'investment\s+section[.\s]*(\d+)',
-                r'report.*chief investment officer[.\s]*(\d+)',
-                r'cio\s+report[.\s]*(\d+)',
-                r'investment\s+overview[.\s]*(\d+)',
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, text_lower)
+            for pattern in _TOC_PATTERNS:
+                match = pattern.search(text_lower)
                 if match:
                     try:
                         page_num = int(match.group(1))
@@ -208,20 +606,12 @@ def _find_investment_section_pages(pdf, total_pages: int) -> tuple[int, int]:
     
     for i in range(scan_start, scan_end):
         try:
-            if hasattr(pdf, 'pages'):
-                text = pdf.pages[i].extract_text() or ""
-            else:
-                text = pdf.pages[i].extract_text() or ""
+            text = page_text(i)
             
             text_lower = text.lower()
             
             # Look for section header
-            if any(marker in text_lower for marker in [
-                "investment section",
-                "report from the chief investment officer", 
-                "report of the chief investment officer",
-                "chief investment officer's report"
-            ]):
+            if any(marker in text_lower for marker in _SECTION_HEADER_MARKERS):
                 investment_start = i
                 investment_end = min(i + 40, total_pages)
                 logger.info(f"Found Investment Section header at page {i}")
@@ -234,42 +624,44 @@ def _find_investment_section_pages(pdf, total_pages: int) -> tuple[int, int]:
     return None, None
 
 
-def extract_text_from_pdf_pdfplumber(data: bytes, max_pages: int = 100) -> str:
+def _memoized_page_text(extract):
+    """Wrap extract(i) so pages scanned for the TOC aren't extracted twice."""
+    cache = {}
+    def page_text(i):
+        if i not in cache:
+            cache[i] = extract(i) or ""
+        return cache[i]
+    return page_text
+
+
+# On a located Investment Section, how many leading pages (cover, letter,
+# TOC) to keep alongside it
+INTRO_PAGES_WITH_SECTION = 5
+
+
+def _select_cafr_pages(page_text, total_pages: int, max_pages: int) -> list:
     """
-    Extract text from PDF using pdfplumber (better for tables).
-    Specifically targets CAFR structure:
-    1. First 15 pages (intro, exec summary, board/staff list)
-    2. Investment Section (found via TOC or header scan)
-    3. Any other high-value pages
+    Pick the page indices worth reading in a CAFR/annual report:
+    - Investment Section found (via TOC or header scan): the first few
+      pages plus that section only
+    - Otherwise: first 15 pages (intro, exec summary, board/staff list),
+      a sample of the middle pages, and the last 5
     """
-    if not data or not pdfplumber:
-        return ""
-    
-    try:
-        pdf = pdfplumber.open(BytesIO(data))
-    except Exception as e:
-        logger.debug(f"pdfplumber failed to open PDF: {e}")
-        return ""
-    
-    total_pages = len(pdf.pages)
-    logger.info(f"PDF has {total_pages} pages, using pdfplumber with CAFR-aware extraction")
-    
     pages_to_read = set()
     
-    # ALWAYS read first 15 pages (intro, letter from ED, board list, staff, TOC)
-    for i in range(min(15, total_pages)):
-        pages_to_read.add(i)
-    
     # Find Investment Section
-    inv_start, inv_end = _find_investment_section_pages(pdf, total_pages)
+    inv_start, inv_end = _find_investment_section_pages(page_text, total_pages)
     
     if inv_start is not None:
-        # Read the entire Investment Section
-        for i in range(inv_start, inv_end):
-            pages_to_read.add(i)
+        # Read the entire Investment Section, plus the intro/TOC pages
+        pages_to_read.update(range(min(INTRO_PAGES_WITH_SECTION, total_pages)))
+        pages_to_read.update(range(inv_start, inv_end))
         logger.info(f"Will read Investment Section pages {inv_start}-{inv_end}")
     else:
-        # Fallback: sample middle pages where investment content usually lives
+        # Read first 15 pages (intro, letter from ED, board list, staff, TOC)
+        pages_to_read.update(range(min(15, total_pages)))
+        
+        # Sample middle pages where investment content usually lives
         sample_ranges = [
             (15, 50, 3),    # Pages 15-50, every 3rd page
             (50, 100, 2),   # Pages 50-100, every 2nd page (investment section often here)
@@ -282,63 +674,181 @@ def extract_text_from_pdf_pdfplumber(data: bytes, max_pages: int = 100) -> str:
             actual_end = min(end, total_pages)
             for i in range(start, actual_end, step):
                 pages_to_read.add(i)
-    
-    # Also read last 5 pages (sometimes has consultant/advisor info)
-    for i in range(max(0, total_pages - 5), total_pages):
-        pages_to_read.add(i)
+        
+        # Also read last 5 pages (sometimes has consultant/advisor info)
+        pages_to_read.update(range(max(0, total_pages - 5), total_pages))
     
     # Sort and limit
     pages_to_read = sorted(pages_to_read)[:max_pages]
     logger.info(f"Reading {len(pages_to_read)} pages from PDF")
-    
-    # Extract text, prioritizing high-value pages
+    return pages_to_read
+
+
+def _table_text(page) -> str:
+    """Flatten a pdfplumber page's tables into ' | '-joined rows."""
+    rows = []
+    try:
+        for table in page.extract_tables():
+            for row in table or ():
+                if row:
+                    row_text = " | ".join(str(cell) if cell else "" for cell in row)
+                    if row_text.strip():
+                        rows.append(row_text)
+    except Exception:
+        pass
+    return "".join("\n" + row for row in rows)
+
+
+def _join_by_relevance(page_texts: list, pages_read: int) -> str:
+    """Join (index, text, score) triples with high-value pages (score >= 3) first."""
     high_value_texts = []
     regular_texts = []
+    for i, text, score in page_texts:
+        if text.strip():
+            if score >= 3:
+                high_value_texts.append(f"[Page {i+1}]\n{text}")
+            else:
+                regular_texts.append(text)
     
-    for i in pages_to_read:
+    # Prioritize high-value pages at the front
+    result = "\n\n".join(high_value_texts + regular_texts)
+    logger.info(f"Extracted {len(result)} chars from {pages_read} pages ({len(high_value_texts)} high-value pages)")
+    return result
+
+
+def _collapsed_len(text: str) -> int:
+    """Length of text once whitespace is collapsed (as join_trimmed will)."""
+    return len(" ".join(text.split()))
+
+
+def _budget_reached(high_chars: int, char_budget) -> bool:
+    """
+    High-value pages are joined first, so once they alone fill the budget
+    nothing read afterwards can survive the final trim.
+    """
+    return char_budget is not None and high_chars >= char_budget
+
+
+# PDFium is not thread-safe, and PDFs are extracted on the fetch pool
+_PDFIUM_LOCK = threading.Lock()
+
+
+def extract_text_from_pdf_pdfium(data: bytes, max_pages: int = 100, char_budget: int = None) -> str:
+    """
+    Extract text from PDF using pypdfium2, with the same CAFR-aware page
+    selection as the pdfplumber path. pdfplumber is only opened to pull
+    tables from pages that already look high-value. Stops early once
+    high-value pages fill char_budget.
+    """
+    pdfium = _pdfium()
+    if not data or not pdfium:
+        return ""
+    
+    with _PDFIUM_LOCK:
         try:
-            page = pdf.pages[i]
-            text = page.extract_text() or ""
+            pdf = pdfium.PdfDocument(data)
+        except Exception as e:
+            logger.debug(f"pypdfium2 failed to open PDF: {e}")
+            return ""
+        
+        try:
+            total_pages = len(pdf)
+            logger.info(f"PDF has {total_pages} pages, using pypdfium2 with CAFR-aware extraction")
             
-            # Also try to extract tables (common in investment sections)
-            try:
-                tables = page.extract_tables()
-                for table in tables:
-                    if table:
-                        for row in table:
-                            if row:
-                                row_text = " | ".join(str(cell) if cell else "" for cell in row)
-                                if row_text.strip():
-                                    text += "\n" + row_text
-            except:
-                pass
+            def extract(i):
+                textpage = pdf[i].get_textpage()
+                try:
+                    return textpage.get_text_bounded()
+                finally:
+                    textpage.close()
             
-            if text.strip():
-                score = _score_page_relevance(text)
-                if score >= 3:
-                    high_value_texts.append(f"[Page {i+1}]\n{text}")
-                else:
-                    regular_texts.append(text)
-                    
+            page_text = _memoized_page_text(extract)
+            pages_to_read = _select_cafr_pages(page_text, total_pages, max_pages)
+            page_texts = []
+            high_chars = 0
+            for i in pages_to_read:
+                if _budget_reached(high_chars, char_budget):
+                    break
+                try:
+                    text = page_text(i)
+                    score = _score_page_relevance(text)
+                    page_texts.append((i, text, score))
+                    if score >= 3:
+                        high_chars += _collapsed_len(text)
+                except Exception as e:
+                    logger.debug(f"Failed to extract page {i}: {e}")
+        finally:
+            pdf.close()
+    
+    # Tables (common in investment sections) only where they are likely to matter
+    high_value = [n for n, (i, text, score) in enumerate(page_texts) if score >= 3]
+    pdfplumber = _pdfplumber()
+    if high_value and pdfplumber:
+        try:
+            with pdfplumber.open(BytesIO(data)) as plumber:
+                high_chars = 0
+                for n in high_value:
+                    if _budget_reached(high_chars, char_budget):
+                        break
+                    # Extra table text can only raise the score, so keep it
+                    i, text, score = page_texts[n]
+                    text += _table_text(plumber.pages[i])
+                    page_texts[n] = (i, text, score)
+                    high_chars += _collapsed_len(text)
+        except Exception as e:
+            logger.debug(f"pdfplumber table extraction failed: {e}")
+    
+    return _join_by_relevance(page_texts, len(page_texts))
+
+
+def extract_text_from_pdf_pdfplumber(data: bytes, max_pages: int = 100, char_budget: int = None) -> str:
+    """
+    Extract text from PDF using pdfplumber (better for tables).
+    Specifically targets CAFR structure (see _select_cafr_pages), stopping
+    early once high-value pages fill char_budget.
+    """
+    pdfplumber = _pdfplumber()
+    if not data or not pdfplumber:
+        return ""
+    
+    try:
+        pdf = pdfplumber.open(BytesIO(data))
+    except Exception as e:
+        logger.debug(f"pdfplumber failed to open PDF: {e}")
+        return ""
+    
+    total_pages = len(pdf.pages)
+    logger.info(f"PDF has {total_pages} pages, using pdfplumber with CAFR-aware extraction")
+    
+    page_text = _memoized_page_text(lambda i: pdf.pages[i].extract_text())
+    pages_to_read = _select_cafr_pages(page_text, total_pages, max_pages)
+    
+    page_texts = []
+    high_chars = 0
+    for i in pages_to_read:
+        if _budget_reached(high_chars, char_budget):
+            break
+        try:
+            # Also extract tables (common in investment sections)
+            text = page_text(i) + _table_text(pdf.pages[i])
+            score = _score_page_relevance(text)
+            page_texts.append((i, text, score))
+            if score >= 3:
+                high_chars += _collapsed_len(text)
         except Exception as e:
             logger.debug(f"Failed to extract page {i}: {e}")
             continue
     
     pdf.close()
     
-    # Prioritize high-value pages at the front
-    all_texts = high_value_texts + regular_texts
-    result = "\n\n".join(all_texts)
-    
-    logger.info(f"Extracted {len(result)} chars from {len(pages_to_read)} pages ({len(high_value_texts)} high-value pages)")
-    
-    return result
+    return _join_by_relevance(page_texts, len(page_texts))
 
 
-def extract_text_from_pdf_pypdf(data: bytes, max_pages: int = 60) -> str:
+def extract_text_from_pdf_pypdf(data: bytes, max_pages: int = 60, char_budget: int = None) -> str:
     """Extract text from PDF bytes using pypdf (fallback)."""
     if not data:
         return ""
+    from pypdf import PdfReader
     try:
         reader = PdfReader(BytesIO(data))
     except Exception as e:
@@ -369,53 +879,121 @@ def extract_text_from_pdf_pypdf(data: bytes, max_pages: int = 60) -> str:
         
         pages_to_read = sorted(set(pages_to_read))[:max_pages]
 
+    chars = 0
     for i in pages_to_read:
+        if _budget_reached(chars, char_budget):
+            break
         try:
             page = reader.pages[i]
             text = page.extract_text() or ""
             if text.strip():
                 texts.append(text)
+                chars += _collapsed_len(text)
         except Exception:
             continue
 
     return "\n\n".join(texts)
 
 
-def extract_text_from_pdf(data: bytes) -> str:
-    """Extract text from PDF bytes using best available library."""
+# PDF extraction is CPU-bound and PDFium is single-threaded per process, so
+# larger PDFs are parsed in worker processes; small ones aren't worth the
+# cost of shipping the bytes across
+PDF_PROCESS_MIN_BYTES = 512 * 1024
+
+
+@functools.cache
+def _pdf_process_pool() -> ProcessPoolExecutor:
+    # spawn, not fork: this process has live threads and connection pools
+    pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+    atexit.register(pool.shutdown, cancel_futures=True)
+    return pool
+
+
+def _extract_text_from_pdf_offloaded(data: bytes, char_budget) -> str:
+    if len(data) < PDF_PROCESS_MIN_BYTES:
+        return _extract_text_from_pdf(data, char_budget)
+    try:
+        return _pdf_process_pool().submit(_extract_text_from_pdf, data, char_budget).result()
+    except BrokenProcessPool as e:
+        logger.warning(f"PDF worker process failed ({e}), extracting in-process")
+        _pdf_process_pool.cache_clear()
+        return _extract_text_from_pdf(data, char_budget)
+
+
+def extract_text_from_pdf(data: bytes, char_budget: int = MAX_REPORT_TEXT_CHARS) -> str:
+    """
+    Extract text from PDF bytes using best available library (cached by
+    content hash). Pages that could not make it into the first char_budget
+    chars of the (whitespace-collapsed) result are not read; None reads all.
+    """
     if not data:
         return ""
     
-    # Try pdfplumber first (better for tables)
-    if pdfplumber:
-        result = extract_text_from_pdf_pdfplumber(data)
+    key = f"{_cache_key(data)}-{char_budget}" if _PDF_TEXT_CACHE is not None else None
+    text = _cached_text(_PDF_TEXT_CACHE, key)
+    if text is None:
+        text = _extract_text_from_pdf_offloaded(data, char_budget)
+        _store_text(_PDF_TEXT_CACHE, key, text)
+    return text
+
+
+def _extract_text_from_pdf(data: bytes, char_budget: int = None) -> str:
+    # Try pypdfium2 first (fast), then pdfplumber (better for tables)
+    if _pdfium():
+        result = extract_text_from_pdf_pdfium(data, char_budget=char_budget)
+        if result:
+            return result
+    
+    if _pdfplumber():
+        result = extract_text_from_pdf_pdfplumber(data, char_budget=char_budget)
         if result:
             return result
     
     # Fall back to pypdf
-    return extract_text_from_pdf_pypdf(data)
+    return extract_text_from_pdf_pypdf(data, char_budget=char_budget)
 
 
 def extract_text(url: str) -> str:
     """Fetch URL and extract text (handles both HTML and PDF)."""
     content_type, body = safe_get(url)
-    if not content_type or body == "":
+    if not content_type or not body:
         return ""
 
     if "pdf" in content_type or url.lower().endswith(".pdf"):
-        # PDF
-        if isinstance(body, str):
-            body = body.encode("utf-8", errors="ignore")
         logger.info(f"Extracting PDF: {url}")
         return extract_text_from_pdf(body)
     else:
-        # Assume HTML or text
-        if isinstance(body, bytes):
-            try:
-                body = body.decode("utf-8", errors="ignore")
-            except Exception:
-                return ""
-        return extract_text_from_html(body)
+        # Assume HTML
+        key = _cache_key(content_type, body) if _HTML_TEXT_CACHE is not None else None
+        text = _cached_text(_HTML_TEXT_CACHE, key)
+        if text is None:
+            text = extract_text_from_html(_html_body(content_type, body))
+            _store_text(_HTML_TEXT_CACHE, key, text)
+        return text
+
+
+def _parse_html(html):
+    """Parse HTML with lxml; returns None for empty or unparseable input."""
+    try:
+        return lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def _pdf_links_from_tree(tree, base_url: str) -> list:
+    """Absolute URLs of every href in a parsed page that points at a PDF."""
+    pdf_urls = []
+    for href in tree.xpath("//@href"):
+        if not href.lower().endswith(".pdf"):
+            continue
+        # Convert to absolute URL
+        if href.startswith("http"):
+            pdf_urls.append(href)
+        elif href.startswith("/"):
+            pdf_urls.append(urljoin(base_url, href))
+        else:
+            pdf_urls.append(urljoin(base_url + "/", href))
+    return unique_urls(pdf_urls)
 
 
 def find_pdf_links_in_html(html: str, base_url: str) -> list:
@@ -426,24 +1004,11 @@ def find_pdf_links_in_html(html: str, base_url: str) -> list:
     if not html:
         return []
     
-    pdf_urls = []
-    
-    # Find all href attributes pointing to PDFs
-    href_pattern = r'href=["\']([^"\']*\.pdf)["\']'
-    matches = re.findall(href_pattern, html, re.IGNORECASE)
-    
-    for match in matches:
-        # Convert to absolute URL
-        if match.startswith("http"):
-            pdf_urls.append(match)
-        elif match.startswith("/"):
-            pdf_urls.append(urljoin(base_url, match))
-        else:
-            pdf_urls.append(urljoin(base_url + "/", match))
-    
-    # Also look for common patterns in text
-    # e.g., "Download Annual Report (PDF)"
-    return list(set(pdf_urls))
+    # Parsed rather than regex-scanned, so hrefs in comments/scripts don't count
+    tree = _parse_html(html)
+    if tree is None:
+        return []
+    return _pdf_links_from_tree(tree, base_url)
 
 
 def fetch_page_and_find_pdfs(url: str) -> tuple:
@@ -452,24 +1017,35 @@ def fetch_page_and_find_pdfs(url: str) -> tuple:
     Returns (page_text, [pdf_urls])
     """
     content_type, body = safe_get(url)
-    if not content_type or body == "":
+    if not content_type or not body:
         return "", []
     
     if "pdf" in content_type or url.lower().endswith(".pdf"):
         # It's already a PDF
-        if isinstance(body, str):
-            body = body.encode("utf-8", errors="ignore")
         return extract_text_from_pdf(body), []
     
     # It's HTML - extract text and find PDF links
-    if isinstance(body, bytes):
-        try:
-            body = body.decode("utf-8", errors="ignore")
-        except Exception:
-            return "", []
+    key = _cache_key(content_type, body) if _HTML_TEXT_CACHE is not None else None
+    body = _html_body(content_type, body)
+    if body is None:
+        return "", []
     
-    page_text = extract_text_from_html(body)
-    pdf_links = find_pdf_links_in_html(body, url)
+    page_text = _cached_text(_HTML_TEXT_CACHE, key)
+    if page_text is not None or _resiliparse():
+        # resiliparse does its own (fast) parse; lxml only for the links
+        if page_text is None:
+            page_text = extract_text_from_html(body)
+            _store_text(_HTML_TEXT_CACHE, key, page_text)
+        return page_text, find_pdf_links_in_html(body, url)
+    
+    # Parse once, the way trafilatura would, and share the tree. Links are
+    # read first since extraction may prune the tree.
+    tree = _trafilatura().load_html(body)
+    if tree is None:
+        return "", find_pdf_links_in_html(body, url)
+    pdf_links = _pdf_links_from_tree(tree, url)
+    page_text = extract_text_from_html(tree)
+    _store_text(_HTML_TEXT_CACHE, key, page_text)
     
     return page_text, pdf_links
 
@@ -584,8 +1160,21 @@ REPORT_PATHS = [
 ]
 
 
+# Relative forms of the path sets, for appending to a site root
+_ABOUT_SUFFIXES = tuple(p.lstrip("/") for p in ABOUT_PATHS)
+_INVESTMENT_SUFFIXES = tuple(p.lstrip("/") for p in INVESTMENT_PATHS)
+_POLICY_SUFFIXES = tuple(p.lstrip("/") for p in POLICY_PATHS)
+_REPORT_SUFFIXES = tuple(p.lstrip("/") for p in REPORT_PATHS)
+
+
 # ----- 4. Helper: build base URL from Notion page ----- #
 
+def _get_url_prop(props: dict, name: str):
+    """Value of a Notion URL property, or None if missing, empty or another type."""
+    prop = props.get(name)
+    return prop.get("url") if prop and prop.get("type") == "url" else None
+
+
 def get_base_url_from_notion_page(allocator_page: dict) -> str:
     """
     Try to derive a base URL from the Notion allocator page properties:
@@ -595,29 +1184,20 @@ def get_base_url_from_notion_page(allocator_page: dict) -> str:
     """
     props = allocator_page.get("properties", {})
 
-    # Try Main Website first
-    main_site_prop = props.get("Main Website", {})
-    if main_site_prop.get("type") == "url":
-        main_site = main_site_prop.get("url")
-        if main_site:
-            return main_site.rstrip("/")
-
-    # Try Website
-    website_prop = props.get("Website", {})
-    if website_prop.get("type") == "url":
-        website = website_prop.get("url")
-        if website:
-            return website.rstrip("/")
+    # Try Main Website first, then Website
+    site = _get_url_prop(props, "Main Website") or _get_url_prop(props, "Website")
+    if site:
+        return site.rstrip("/")
 
     # Fallback to Domain (text field)
     domain = ""
-    domain_prop = props.get("Domain", {})
-    if domain_prop.get("type") == "rich_text":
-        texts = domain_prop.get("rich_text", [])
+    domain_prop = props.get("Domain")
+    if isinstance(domain_prop, str):
+        domain = domain_prop
+    elif domain_prop and domain_prop.get("type") == "rich_text":
+        texts = domain_prop.get("rich_text")
         if texts:
             domain = texts[0].get("plain_text", "")
-    elif isinstance(domain_prop, str):
-        domain = domain_prop
 
     if domain:
         domain = domain.strip()
@@ -638,26 +1218,172 @@ def normalize_url(base_url: str, path: str) -> str:
 
 
 def unique_urls(urls: list) -> list:
-    """Deduplicate URLs while preserving order."""
-    seen = set()
-    out = []
-    for u in urls:
-        if not u or u in seen:
-            continue
-        seen.add(u)
-        out.append(u)
-    return out
+    """Deduplicate URLs (dropping empty ones) while preserving order."""
+    return list(dict.fromkeys(filter(None, urls)))
+
+
+def _collapse_whitespace(text: str, limit: int) -> str:
+    """
+    Same as re.sub(r"\s+", " ", text)[:limit], but collapses only a growing
+    prefix of text until it yields `limit` chars, using the C-level
+    str.split() instead of a regex pass over the whole string.
+    """
+    window = limit + 1
+    while True:
+        chunk = text[:window]
+        words = chunk.split()
+        if not words:
+            collapsed = " " if chunk else ""
+        else:
+            collapsed = " ".join(words)
+            if chunk[0].isspace():
+                collapsed = " " + collapsed
+            if chunk[-1].isspace():
+                collapsed += " "
+        # Collapsing a prefix always yields a prefix of the full result
+        if len(collapsed) >= limit or window >= len(text):
+            return collapsed[:limit]
+        window *= 4
 
 
 def trim_text(text: str, limit: int = MAX_TEXT_CHARS) -> str:
     """Collapse whitespace and trim to limit."""
     if not text:
         return ""
-    text = re.sub(r"\s+", " ", text)
-    return text[:limit]
+    return _collapse_whitespace(text, limit)
+
+
+def join_trimmed(texts: list, limit: int) -> str:
+    """
+    Same result as trim_text(" ".join(texts), limit), but stops once the
+    limit is reached, so trailing multi-MB PDF extractions are never
+    concatenated or scanned just to be cut off.
+    """
+    parts = []
+    size = 0
+    ends_with_space = False
+    for i, text in enumerate(texts):
+        if size >= limit:
+            break
+        # One spare char in case the leading space is dropped below
+        piece = _collapse_whitespace(text, limit - size + 1)
+        if i and not piece.startswith(" "):
+            piece = " " + piece
+        # A whitespace run spanning two pieces collapses to one space
+        if ends_with_space:
+            piece = piece.removeprefix(" ")
+        if not piece:
+            continue
+        piece = piece[:limit - size]
+        parts.append(piece)
+        size += len(piece)
+        ends_with_space = piece.endswith(" ")
+    return "".join(parts)
+
+
+# ----- 6. Bucket fetchers ----- #
+
+def _fetch_bucket_texts(urls: list):
+    """Start fetching each URL in a bucket; iterate the result for texts in order."""
+    return _FETCH_POOL.map(extract_text, urls)
+
+
+def _fetch_bucket_texts_and_pdfs(urls: list):
+    """Start fetching each URL in a bucket; iterate the result for (text, pdf_links) in order."""
+    return _FETCH_POOL.map(fetch_page_and_find_pdfs, urls)
+
+
+def _probe_buckets(buckets: list, trusted: set) -> list:
+    """
+    probe_urls over the guessed URLs of several buckets at once, so all HEADs
+    are in flight together. URLs in `trusted` are kept without a probe.
+    """
+    guessed = [url for bucket in buckets for url in bucket if url not in trusted]
+    live = trusted.union(probe_urls(guessed))
+    return [[url for url in bucket if url in live] for bucket in buckets]
+
+
+def _first_live(urls: list, count: int, trusted: set) -> list:
+    """
+    The first `count` live URLs of urls, in order. URLs in `trusted` count
+    as live without a probe; the rest are probed in rounds of just as many
+    as are still missing, so a long ranked list stops at the first hits.
+    """
+    live = []
+    start = 0
+    while len(live) < count and start < len(urls):
+        batch = urls[start:start + count - len(live)]
+        start += len(batch)
+        ok = set(probe_urls([url for url in batch if url not in trusted]))
+        live.extend(url for url in batch if url in trusted or url in ok)
+    return live
+
+
+def _gather_texts_and_pdfs(results) -> tuple:
+    """Split fetch_page_and_find_pdfs results into (non-empty texts, pdf_links_found)."""
+    texts = []
+    found = []
+    for txt, found_pdfs in results:
+        if txt:
+            texts.append(txt)
+        found.extend(found_pdfs)
+    return texts, found
+
+
+# ----- 7. PDF ranking ----- #
 
+# Recency tiers, checked in order (only the first matching tier counts)
+_PDF_YEAR_TIERS = (
+    (("fy25", "fy24", "2025", "2024"), -50),
+    (("fy23", "2023"), -40),
+    (("fy22", "2022"), -30),
+)
 
-# ----- 6. Main entry: collect_web_text ----- #
+# Independent (markers, delta) adjustments; each applies once if any marker matches
+_PDF_SCORE_RULES = (
+    (("investment",), -15),  # Prefer investment sections
+    (("cafr", "acfr"), -10),  # CAFR/ACFR are good
+    (("introductory", "intro"), 20),  # Penalize partial sections
+    (("fy20", "fy19", "fy18"), 30),  # Penalize old years
+    (("2020", "2019", "2018"), 30),
+)
+
+_STRIP_SEPARATORS = str.maketrans("", "", "-_")
+
+
+def pdf_priority(url: str) -> int:
+    """Sort key for candidate PDFs (lower is better): recent annual reports and board books first."""
+    url_lower = url.lower()
+    url_clean = url_lower.translate(_STRIP_SEPARATORS)
+    score = 100  # Base score
+    
+    # Prefer recent years (FY24, FY25, 2024, 2025)
+    for markers, delta in _PDF_YEAR_TIERS:
+        if any(m in url_lower for m in markers):
+            score += delta
+            break
+    
+    # Board books are VERY valuable - current commitments, manager changes
+    if "board" in url_lower:
+        score -= 40 if "book" in url_lower else 25
+    
+    # Prefer full annual report books over sections
+    if "annualreportbook" in url_clean:
+        score -= 30
+    elif "annual" in url_lower and "report" in url_lower:
+        score -= 20
+    
+    for markers, delta in _PDF_SCORE_RULES:
+        if any(m in url_lower for m in markers):
+            score += delta
+    
+    if "financialsection" in url_clean:
+        score += 10
+    
+    return score
+
+
+# ----- 8. Main entry: collect_web_text ----- #
 
 def collect_web_text(allocator_page: dict, discovered_urls: dict = None) -> dict:
     """
@@ -680,11 +1406,8 @@ def collect_web_text(allocator_page: dict, discovered_urls: dict = None) -> dict
     discovered_urls = discovered_urls or {}
 
     # Pre-existing URLs from Notion (if specified)
-    investments_page_prop = props.get("Investments Page URL", {})
-    investments_page = investments_page_prop.get("url") if investments_page_prop.get("type") == "url" else None
-    
-    latest_report_prop = props.get("Latest Report URL", {})
-    latest_report_url = latest_report_prop.get("url") if latest_report_prop.get("type") == "url" else None
+    investments_page = _get_url_prop(props, "Investments Page URL")
+    latest_report_url = _get_url_prop(props, "Latest Report URL")
 
     about_urls = []
     policy_urls = []
@@ -718,22 +1441,23 @@ def collect_web_text(allocator_page: dict, discovered_urls: dict = None) -> dict
     if discovered_urls.get("pdf_urls"):
         pdf_urls.extend(discovered_urls["pdf_urls"])
 
-    # Priority 3: Root page as a general "about" source
+    # Everything so far was named explicitly; only the guesses below (and
+    # PDFs linked from crawled pages) get probed
+    trusted_urls = set(about_urls + policy_urls + report_urls + pdf_urls)
+
     if base_url:
+        # Priority 3: Root page as a general "about" source
         about_urls.append(base_url)
+        trusted_urls.add(base_url)
 
-    # Priority 4: Path-based URL guessing
-    for p in ABOUT_PATHS:
-        about_urls.append(normalize_url(base_url, p))
-
-    for p in INVESTMENT_PATHS:
-        policy_urls.append(normalize_url(base_url, p))
-
-    for p in POLICY_PATHS:
-        policy_urls.append(normalize_url(base_url, p))
-
-    for p in REPORT_PATHS:
-        report_urls.append(normalize_url(base_url, p))
+        # Priority 4: Path-based URL guessing
+        # (resolve "." once, dropping any query/fragment, so each guess is a
+        # plain concatenation equal to urljoin(site_root, suffix))
+        site_root = urljoin(base_url.rstrip("/") + "/", ".")
+        about_urls.extend(site_root + s for s in _ABOUT_SUFFIXES)
+        policy_urls.extend(site_root + s for s in _INVESTMENT_SUFFIXES)
+        policy_urls.extend(site_root + s for s in _POLICY_SUFFIXES)
+        report_urls.extend(site_root + s for s in _REPORT_SUFFIXES)
 
     # Deduplicate
     about_urls = unique_urls(about_urls)
@@ -741,101 +1465,57 @@ def collect_web_text(allocator_page: dict, discovered_urls: dict = None) -> dict
     report_urls = unique_urls(report_urls)
     pdf_urls = unique_urls(pdf_urls)
 
-    # Fetch & aggregate text
-    about_texts = []
-    policy_texts = []
-    report_texts = []
-
-    # Fetch about pages
-    for url in about_urls[:MAX_URLS_PER_BUCKET]:
-        txt = extract_text(url)
-        if txt:
-            about_texts.append(txt)
-
-    # Fetch policy/investment pages - also look for PDF links
-    for url in policy_urls[:MAX_URLS_PER_BUCKET]:
-        txt, found_pdfs = fetch_page_and_find_pdfs(url)
-        if txt:
-            policy_texts.append(txt)
-        # Add discovered PDFs to our list
-        for pdf_url in found_pdfs:
-            if pdf_url not in pdf_urls:
-                pdf_urls.append(pdf_url)
-
-    # Fetch report pages - also look for PDF links
-    for url in report_urls[:MAX_URLS_PER_BUCKET]:
-        txt, found_pdfs = fetch_page_and_find_pdfs(url)
-        if txt:
-            report_texts.append(txt)
-        # Add discovered PDFs to our list (prioritize annual reports/CAFRs)
-        for pdf_url in found_pdfs:
-            pdf_lower = pdf_url.lower()
-            # Prioritize annual reports, CAFRs, and investment reports
-            if any(kw in pdf_lower for kw in ["annual", "cafr", "investment", "acfr", "report"]):
-                if pdf_url not in pdf_urls:
-                    pdf_urls.insert(0, pdf_url)  # Add to front
-            elif pdf_url not in pdf_urls:
-                pdf_urls.append(pdf_url)
+    # Most guessed paths 404; drop them with concurrent HEADs before any GET.
+    # URLs from Notion, search and the site root are fetched as-is.
+    about_urls, policy_urls, report_urls = _probe_buckets([about_urls, policy_urls, report_urls], trusted_urls)
+
+    # Fetch & aggregate text - every URL in every bucket is independent, so
+    # queue them all on the shared pool before waiting on any
+    about_results = _fetch_bucket_texts(about_urls[:MAX_URLS_PER_BUCKET])
+    policy_results = _fetch_bucket_texts_and_pdfs(policy_urls[:MAX_URLS_PER_BUCKET])
+    report_results = _fetch_bucket_texts_and_pdfs(report_urls[:MAX_URLS_PER_BUCKET])
+    about_texts = [txt for txt in about_results if txt]
+    policy_texts, policy_pdfs = _gather_texts_and_pdfs(policy_results)
+    report_texts, report_pdfs = _gather_texts_and_pdfs(report_results)
+
+    # Track membership in a set; pages can link dozens of PDFs
+    seen_pdfs = set(pdf_urls)
+
+    # Add PDFs discovered on policy/investment pages
+    for pdf_url in policy_pdfs:
+        if pdf_url not in seen_pdfs:
+            seen_pdfs.add(pdf_url)
+            pdf_urls.append(pdf_url)
+
+    # Add PDFs discovered on report pages (prioritize annual reports/CAFRs)
+    front_pdfs = []
+    for pdf_url in report_pdfs:
+        if pdf_url in seen_pdfs:
+            continue
+        seen_pdfs.add(pdf_url)
+        pdf_lower = pdf_url.lower()
+        # Prioritize annual reports, CAFRs, and investment reports
+        if any(kw in pdf_lower for kw in ["annual", "cafr", "investment", "acfr", "report"]):
+            front_pdfs.append(pdf_url)
+        else:
+            pdf_urls.append(pdf_url)
+    # Each one used to be inserted at the front, so the last found comes first
+    pdf_urls = front_pdfs[::-1] + pdf_urls
 
     # Now fetch the most relevant PDFs
     # Sort PDFs by relevance (prefer recent annual reports and board books)
-    def pdf_priority(url):
-        url_lower = url.lower()
-        score = 100  # Base score (lower is better)
-        
-        # Prefer recent years (FY24, FY25, 2024, 2025)
-        if "fy25" in url_lower or "fy24" in url_lower or "2025" in url_lower or "2024" in url_lower:
-            score -= 50
-        elif "fy23" in url_lower or "2023" in url_lower:
-            score -= 40
-        elif "fy22" in url_lower or "2022" in url_lower:
-            score -= 30
-        
-        # Board books are VERY valuable - current commitments, manager changes
-        if "board" in url_lower and "book" in url_lower:
-            score -= 40
-        elif "board" in url_lower:
-            score -= 25
-        
-        # Prefer full annual report books over sections
-        if "annualreportbook" in url_lower.replace("-", "").replace("_", ""):
-            score -= 30
-        elif "annual" in url_lower and "report" in url_lower:
-            score -= 20
-        
-        # Prefer investment sections
-        if "investment" in url_lower:
-            score -= 15
-        
-        # CAFR/ACFR are good
-        if "cafr" in url_lower or "acfr" in url_lower:
-            score -= 10
-        
-        # Penalize partial sections (introductory, financial only)
-        if "introductory" in url_lower or "intro" in url_lower:
-            score += 20
-        if "financialsection" in url_lower.replace("-", "").replace("_", ""):
-            score += 10
-        
-        # Penalize old years
-        if "fy20" in url_lower or "fy19" in url_lower or "fy18" in url_lower:
-            score += 30
-        if "2020" in url_lower or "2019" in url_lower or "2018" in url_lower:
-            score += 30
-            
-        return score
-    
     pdf_urls = sorted(unique_urls(pdf_urls), key=pdf_priority)
     
     logger.info(f"PDF URLs sorted by priority: {pdf_urls[:5]}")
     
-    # Fetch up to 3 PDFs (they can be large)
+    # Fetch up to 3 PDFs (they can be large), probing only as far down the
+    # ranking as it takes to find them
     # PDF content is HIGH VALUE - put it at the FRONT of report_texts
     pdf_texts = []
-    logger.info(f"Found {len(pdf_urls)} PDF URLs, fetching top 3")
-    for pdf_url in pdf_urls[:3]:
-        logger.info(f"Fetching PDF: {pdf_url}")
-        txt = extract_text(pdf_url)
+    logger.info(f"Found {len(pdf_urls)} PDF URLs, fetching top {MAX_PDFS}")
+    top_pdfs = _first_live(pdf_urls, MAX_PDFS, trusted_urls)
+    logger.info(f"Fetching PDFs: {top_pdfs}")
+    for txt in _FETCH_POOL.map(extract_text, top_pdfs):
         if txt:
             pdf_texts.append(txt)
             logger.info(f"Extracted {len(txt)} chars from PDF")
@@ -844,9 +1524,9 @@ def collect_web_text(allocator_page: dict, discovered_urls: dict = None) -> dict
     all_report_texts = pdf_texts + report_texts
 
     return {
-        "about_text": trim_text(" ".join(about_texts), MAX_TEXT_CHARS),
-        "policy_text": trim_text(" ".join(policy_texts), MAX_TEXT_CHARS),
-        "report_text": trim_text(" ".join(all_report_texts), MAX_REPORT_TEXT_CHARS)
+        "about_text": join_trimmed(about_texts, MAX_TEXT_CHARS),
+        "policy_text": join_trimmed(policy_texts, MAX_TEXT_CHARS),
+        "report_text": join_trimmed(all_report_texts, MAX_REPORT_TEXT_CHARS)
     }
 
 
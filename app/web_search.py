@@ -2,37 +2,275 @@
 Web search module to find investment-related pages for allocators.
 Uses Serper API (Google Search) to discover URLs before scraping.
 """
+import atexit
+import functools
+import hashlib
+import heapq
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit
 import httpx
 import logging
+import orjson
+from .cache import DiskCache, TTLCache
 from .config import SETTINGS
+from .retry import is_retryable_error, retry_http
+from .throttle import TokenBucket
 
 logger = logging.getLogger(__name__)
 
 SERPER_ENDPOINT = "https://google.serper.dev/search"
 
+# One keep-alive connection to Serper shared by every search, instead of a
+# fresh TCP+TLS handshake per query
+# (httpx already asks for gzip/deflate; the transport re-tries failed connects)
+_HTTP = httpx.Client(
+    headers={"X-API-KEY": SETTINGS.search_api_key or "", "Content-Type": "application/json"},
+    timeout=15,
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=30),
+    ),
+)
+atexit.register(_HTTP.close)
+
+# Pace requests under the plan's rate limit rather than bouncing off 429s
+SERPER_BUCKET = TokenBucket(rate=SETTINGS.serper_rps, capacity=SETTINGS.serper_rps)
+
+# Single-query fallback requests run side by side on the same client
+_SEARCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="serper")
+
+# Organic results per (query, num_results). Allocators share many queries
+# (site:pionline.com ...) and are re-enriched often, and every Serper
+# query is billed. Also kept on disk under WEB_CACHE_DIR when set.
+SEARCH_CACHE_TTL = 24 * 3600
+_SEARCH_CACHE = TTLCache(maxsize=2048, ttl=SEARCH_CACHE_TTL)
+_SEARCH_CACHE_DISK = DiskCache(os.path.join(SETTINGS.web_cache_dir, "search"), 5000) if SETTINGS.web_cache_dir else None
+
+# Keyword tables for classifying search results, built once. Plain
+# substring checks: with lists this short they beat a compiled regex
+# alternation, which pays for every start position on a miss.
+SNIPPET_KEYWORDS = (
+    "billion", "million", "asset", "allocation", "portfolio", "aum", "cio", "investment",
+    "committed", "private equity", "real estate", "hedge", "consultant",
+)
+ENRICHMENT_SNIPPET_KEYWORDS = (
+    "billion", "million", "committed", "allocated", "allocation",
+    "private equity", "real estate", "real assets", "hedge fund",
+    "cio", "chief investment", "consultant", "verus", "nepc", "callan",
+    "co-invest", "coinvest", "direct investment",
+)
+INVESTMENT_URL_KEYWORDS = ("investment", "portfolio", "asset-allocation", "assets")
+INVESTMENT_TITLE_KEYWORDS = ("investment", "portfolio", "asset allocation")
+REPORT_URL_KEYWORDS = ("annual-report", "annualreport", "cafr", "financial-report")
+REPORT_TITLE_KEYWORDS = ("annual report", "cafr", "financial report")
+ABOUT_URL_KEYWORDS = ("about", "who-we-are", "our-story", "overview")
+TEAM_URL_KEYWORDS = ("team", "staff", "leadership", "people", "board")
+TEAM_TITLE_KEYWORDS = ("team", "staff", "leadership", "board of trustees")
+
+# Separators dropped when comparing a URL against the compressed allocator name
+_COMPRESS_TABLE = str.maketrans("", "", "-_")
+
+
+# Snippet recency: a leading "[date]" Serper label, relative-date words in
+# it, and four-digit 20xx years
+_BRACKET_DATE_RE = re.compile(r'\[([^\]]+)\]')
+_YEAR_RE = re.compile(r'20(\d{2})')
+_YEAR_WORD_RE = re.compile(r'\b20(\d{2})\b')
+_RELATIVE_DATE_WORDS = ('day', 'hour', 'minute', 'week', 'month ago')
+MAX_SEARCH_SNIPPETS = 20
+# find_investment_pages keeps only the first few snippets it finds
+MAX_PAGE_SNIPPETS = 10
+
+# Query parameters that only track the click, not what the page shows
+_TRACKING_PARAMS = frozenset({"fbclid", "gclid", "msclkid", "mc_cid", "mc_eid", "srsltid"})
+
+# URL slots find_investment_pages fills with the first matching result
+_URL_SLOTS = ("investments_url", "annual_report_url", "about_url", "team_url")
+
+
+def _contains_any(text: str, keywords: tuple) -> bool:
+    return any(kw in text for kw in keywords)
+
+
+def _url_fingerprint(url: str) -> str:
+    """
+    Identity of a result URL for deduplication: scheme, case of the host,
+    "www.", a trailing slash, the fragment and tracking parameters (utm_*,
+    gclid, ...) don't make a different page. Other query parameters do.
+    """
+    parts = urlsplit(url)
+    host = parts.netloc.lower().removeprefix("www.")
+    query = ""
+    if parts.query:
+        query = urlencode([
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.startswith("utm_") and k not in _TRACKING_PARAMS
+        ])
+    return f"{host}{parts.path.rstrip('/')}?{query}"
+
+
+@functools.cache
+def _warn_search_disabled():
+    """Log the missing-key warning once per process, not once per search."""
+    logger.warning("No SEARCH_API_KEY configured, skipping web search")
+
+
+def _search_key(query: str, num_results: int) -> str:
+    return hashlib.blake2b(f"{num_results}\n{query}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cached_results(query: str, num_results: int):
+    """Cached organic results for a query, or None."""
+    key = _search_key(query, num_results)
+    results = _SEARCH_CACHE.get(key, None)
+    if results is None and _SEARCH_CACHE_DISK is not None:
+        blob = _SEARCH_CACHE_DISK.get(key)
+        if blob:
+            try:
+                entry = orjson.loads(blob)
+            except orjson.JSONDecodeError:
+                entry = None
+            if entry and time.time() - entry["ts"] < SEARCH_CACHE_TTL:
+                results = entry["organic"]
+                _SEARCH_CACHE.set(key, results)
+    return results
+
+
+def _store_results(query: str, num_results: int, results: list):
+    key = _search_key(query, num_results)
+    _SEARCH_CACHE.set(key, results)
+    if _SEARCH_CACHE_DISK is not None:
+        try:
+            _SEARCH_CACHE_DISK.set(key, orjson.dumps({"ts": time.time(), "organic": results}))
+        except OSError as e:
+            logger.debug(f"Failed to cache search results: {e}")
+
+
+def _post_search(payload) -> httpx.Response:
+    """POST a Serper query (or batch), paced by SERPER_BUCKET and retried on 429/5xx."""
+    body = orjson.dumps(payload)
+    
+    def send():
+        SERPER_BUCKET.acquire()
+        return _HTTP.post(SERPER_ENDPOINT, content=body)
+    
+    return retry_http(send, max_retries=3)
+
 
 def search_google(query: str, num_results: int = 10) -> list[dict]:
     """
     Search Google via Serper API.
-    Returns list of {title, link, snippet} dicts.
+    Returns list of {title, link, snippet} dicts. Successful results are
+    cached for SEARCH_CACHE_TTL.
     """
     if not SETTINGS.search_api_key:
-        logger.warning("No SEARCH_API_KEY configured, skipping web search")
+        _warn_search_disabled()
         return []
     
+    cached = _cached_results(query, num_results)
+    if cached is not None:
+        return cached
+    
     try:
-        resp = httpx.post(
-            SERPER_ENDPOINT,
-            headers={"X-API-KEY": SETTINGS.search_api_key, "Content-Type": "application/json"},
-            json={"q": query, "num": num_results},
-            timeout=15
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get("organic", [])
+        resp = _post_search({"q": query, "num": num_results})
+        data = orjson.loads(resp.content)
+        results = data.get("organic", [])
     except Exception as e:
         logger.error(f"Serper search failed: {e}")
         return []
+    _store_results(query, num_results, results)
+    return results
+
+
+def search_google_batch(queries: list[str], num_results: int = 10) -> list[list[dict]]:
+    """
+    Run several searches in one Serper request (the endpoint accepts a JSON
+    array of queries and answers with a list in the same order).
+    Returns one list of {title, link, snippet} dicts per query. Repeated
+    and cached queries aren't sent.
+    """
+    if not queries:
+        return []
+    if not SETTINGS.search_api_key:
+        _warn_search_disabled()
+        return [[] for _ in queries]
+    
+    results = {q: _cached_results(q, num_results) for q in dict.fromkeys(queries)}
+    missing = [q for q, r in results.items() if r is None]
+    if len(missing) == 1:
+        results[missing[0]] = search_google(missing[0], num_results=num_results)
+    elif missing:
+        results.update(zip(missing, _search_batch_uncached(missing, num_results)))
+    return [results[q] for q in queries]
+
+
+def _search_batch_uncached(queries: list[str], num_results: int) -> list[list[dict]]:
+    """
+    One batched Serper request for queries. Falls back to one request per
+    query if the batch is rejected or the reply doesn't line up with the
+    queries.
+    """
+    try:
+        resp = _post_search([{"q": q, "num": num_results} for q in queries])
+        data = orjson.loads(resp.content)
+        if isinstance(data, list) and len(data) == len(queries) and all(isinstance(d, dict) for d in data):
+            results = [d.get("organic", []) for d in data]
+            for query, organic in zip(queries, results):
+                _store_results(query, num_results, organic)
+            return results
+        logger.warning("Unexpected Serper batch response, falling back to single queries")
+    except httpx.HTTPStatusError as e:
+        if is_retryable_error(e):
+            # Still rate limited or down after retries; single queries won't fare better
+            logger.error(f"Serper search failed: {e}")
+            return [[] for _ in queries]
+        logger.warning(f"Serper batch search failed ({e}), falling back to single queries")
+    except orjson.JSONDecodeError as e:
+        logger.warning(f"Serper batch search failed ({e}), falling back to single queries")
+    except Exception as e:
+        logger.error(f"Serper search failed: {e}")
+        return [[] for _ in queries]
+    
+    return list(_SEARCH_POOL.map(lambda q: search_google(q, num_results=num_results), queries))
+
+
+def _investment_queries(allocator_name: str, domain: str = None) -> list[str]:
+    """Queries find_investment_pages runs to locate an allocator's pages and PDFs."""
+    # Build search queries - include PDF-specific searches
+    queries = [
+        f'"{allocator_name}" investments asset allocation',
+        f'"{allocator_name}" annual report CAFR',
+        f'"{allocator_name}" investment office CIO team',
+        f'"{allocator_name}" annual report filetype:pdf',  # Direct PDF search
+    ]
+    
+    # If we have a domain, add site-specific searches
+    if domain:
+        queries.extend([
+            f'site:{domain} investments',
+            f'site:{domain} annual report',
+            f'site:{domain} filetype:pdf',  # PDFs on the domain
+        ])
+    
+    return queries[:6]  # Allow more queries
+
+
+def _snippet_queries(allocator_name: str) -> list[str]:
+    """Additional targeted searches for institutional data (snippets only)."""
+    quoted = f'"{allocator_name}"'
+    return [
+        f'{quoted} private equity commitment million',
+        f'{quoted} real estate real assets allocation',
+        f'{quoted} consultant Verus NEPC Callan Mercer',
+        f'{quoted} CIO chief investment officer',
+        f'{quoted} co-investment coinvest',
+        f'site:pionline.com {quoted}',  # P&I has great pension data
+        f'site:top1000funds.com {quoted}',  # Top1000 funds profiles
+    ]
 
 
 def find_investment_pages(allocator_name: str, domain: str = None) -> dict:
@@ -48,7 +286,15 @@ def find_investment_pages(allocator_name: str, domain: str = None) -> dict:
         "search_snippets": list of relevant snippets
     }
     """
-    result = {
+    if not SETTINGS.search_api_key:
+        _warn_search_disabled()
+        return _empty_pages()
+    queries = _investment_queries(allocator_name, domain)
+    return _categorize_results(allocator_name, domain, queries, search_google_batch(queries, num_results=5))
+
+
+def _empty_pages() -> dict:
+    return {
         "investments_url": None,
         "annual_report_url": None,
         "about_url": None,
@@ -56,43 +302,35 @@ def find_investment_pages(allocator_name: str, domain: str = None) -> dict:
         "pdf_urls": [],
         "search_snippets": []
     }
-    
-    # Build search queries - include PDF-specific searches
-    queries = [
-        f'"{allocator_name}" investments asset allocation',
-        f'"{allocator_name}" annual report CAFR',
-        f'"{allocator_name}" investment office CIO team',
-        f'"{allocator_name}" annual report filetype:pdf',  # Direct PDF search
-    ]
-    
-    # If we have a domain, add site-specific searches
-    if domain:
-        queries.extend([
-            f'site:{domain} investments',
-            f'site:{domain} annual report',
-            f'site:{domain} filetype:pdf',  # PDFs on the domain
-        ])
+
+
+def _categorize_results(allocator_name: str, domain: str, queries: list, query_results: list) -> dict:
+    """Build find_investment_pages' result from the results of its queries."""
+    result = _empty_pages()
     
     all_results = []
-    for query in queries[:6]:  # Allow more queries
-        results = search_google(query, num_results=5)
+    for query, results in zip(queries, query_results):
         all_results.extend(results)
         logger.info(f"Search '{query}' returned {len(results)} results")
     
-    # Deduplicate by URL
+    # Deduplicate by URL (first seen wins among trivial variants)
     seen_urls = set()
     unique_results = []
     for r in all_results:
         url = r.get("link", "")
-        if url and url not in seen_urls:
-            seen_urls.add(url)
+        if not url:
+            continue
+        fingerprint = _url_fingerprint(url)
+        if fingerprint not in seen_urls:
+            seen_urls.add(fingerprint)
             unique_results.append(r)
     
     # Build a normalized allocator name for matching
     allocator_name_lower = allocator_name.lower()
     # Create variations for matching (e.g., "ZOMA Capital" -> ["zoma", "zomacapital"])
     allocator_words = [w.lower() for w in allocator_name.split() if len(w) > 2]
-    allocator_compressed = allocator_name_lower.replace(" ", "").replace("-", "").replace("_", "")
+    allocator_compressed = allocator_name_lower.replace(" ", "").translate(_COMPRESS_TABLE)
+    domain_stem = domain.lower().split('.')[0] if domain else None
     
     # Categorize results
     for r in unique_results:
@@ -106,13 +344,13 @@ def find_investment_pages(allocator_name: str, domain: str = None) -> dict:
         if url_lower.endswith(".pdf"):
             # ONLY include PDFs that appear to be about this specific allocator
             # Check URL, title, and snippet for allocator name
-            url_compressed = url_lower.replace("-", "").replace("_", "").replace("%20", "")
+            url_compressed = url_lower.translate(_COMPRESS_TABLE).replace("%20", "")
             
             pdf_is_relevant = (
                 allocator_compressed in url_compressed or
                 allocator_name_lower in title or
                 allocator_name_lower in snippet_lower or
-                (domain and domain.lower().split('.')[0] in url_lower) or
+                (domain_stem and domain_stem in url_lower) or
                 any(word in url_lower for word in allocator_words if len(word) > 4)
             )
             
@@ -122,8 +360,8 @@ def find_investment_pages(allocator_name: str, domain: str = None) -> dict:
             else:
                 logger.info(f"Skipping unrelated PDF: {url}")
         
-        # Collect relevant snippets for LLM context
-        if any(kw in snippet_lower for kw in ["billion", "million", "asset", "allocation", "portfolio", "aum", "cio", "investment", "committed", "private equity", "real estate", "hedge", "consultant"]):
+        # Collect relevant snippets for LLM context (until there are enough)
+        if len(result["search_snippets"]) < MAX_PAGE_SNIPPETS and _contains_any(snippet_lower, SNIPPET_KEYWORDS):
             # Add date context if available from search result
             date_str = r.get("date", "")
             if date_str:
@@ -131,33 +369,30 @@ def find_investment_pages(allocator_name: str, domain: str = None) -> dict:
             else:
                 result["search_snippets"].append(snippet)
         
-        # Categorize URL by type (non-PDFs)
-        if not url_lower.endswith(".pdf"):
+        # Categorize URL by type (non-PDFs), while any slot is still open
+        if not url_lower.endswith(".pdf") and not all(result[slot] for slot in _URL_SLOTS):
             if not result["investments_url"]:
-                if any(kw in url_lower for kw in ["investment", "portfolio", "asset-allocation", "assets"]):
+                if _contains_any(url_lower, INVESTMENT_URL_KEYWORDS):
                     result["investments_url"] = url
-                elif any(kw in title for kw in ["investment", "portfolio", "asset allocation"]):
+                elif _contains_any(title, INVESTMENT_TITLE_KEYWORDS):
                     result["investments_url"] = url
             
             if not result["annual_report_url"]:
-                if any(kw in url_lower for kw in ["annual-report", "annualreport", "cafr", "financial-report"]):
+                if _contains_any(url_lower, REPORT_URL_KEYWORDS):
                     result["annual_report_url"] = url
-                elif any(kw in title for kw in ["annual report", "cafr", "financial report"]):
+                elif _contains_any(title, REPORT_TITLE_KEYWORDS):
                     result["annual_report_url"] = url
             
             if not result["about_url"]:
-                if any(kw in url_lower for kw in ["about", "who-we-are", "our-story", "overview"]):
+                if _contains_any(url_lower, ABOUT_URL_KEYWORDS):
                     result["about_url"] = url
             
             if not result["team_url"]:
-                if any(kw in url_lower for kw in ["team", "staff", "leadership", "people", "board"]):
+                if _contains_any(url_lower, TEAM_URL_KEYWORDS):
                     result["team_url"] = url
-                elif any(kw in title for kw in ["team", "staff", "leadership", "board of trustees"]):
+                elif _contains_any(title, TEAM_TITLE_KEYWORDS):
                     result["team_url"] = url
     
-    # Limit snippets
-    result["search_snippets"] = result["search_snippets"][:10]
-    
     logger.info(f"Found URLs for {allocator_name}: investments={result['investments_url']}, report={result['annual_report_url']}, pdfs={len(result['pdf_urls'])}")
     
     return result
@@ -168,98 +403,82 @@ def enrich_allocator_with_search(allocator_name: str, domain: str = None) -> dic
     Main entry point: search for allocator info and return enriched context.
     Returns dict with URLs and snippets that can augment web scraping.
     """
-    pages = find_investment_pages(allocator_name, domain)
+    if not SETTINGS.search_api_key:
+        _warn_search_disabled()
+        return _empty_pages()
     
-    # Do additional targeted searches for institutional data
-    additional_queries = [
-        f'"{allocator_name}" private equity commitment million',
-        f'"{allocator_name}" real estate real assets allocation',
-        f'"{allocator_name}" consultant Verus NEPC Callan Mercer',
-        f'"{allocator_name}" CIO chief investment officer',
-        f'"{allocator_name}" co-investment coinvest',
-        f'site:pionline.com "{allocator_name}"',  # P&I has great pension data
-        f'site:top1000funds.com "{allocator_name}"',  # Top1000 funds profiles
-    ]
+    # All searches go out in one batch: the page-finding queries first
+    queries = _investment_queries(allocator_name, domain)
+    additional_queries = _snippet_queries(allocator_name)
+    query_results = search_google_batch(queries + additional_queries, num_results=5)
+    pages = _categorize_results(allocator_name, domain, queries, query_results[:len(queries)])
     
-    for query in additional_queries:
-        results = search_google(query, num_results=5)
+    # Rank as we collect: (recency priority, arrival order) keeps the
+    # stable recency sort without a separate pass
+    seen = set(pages["search_snippets"])
+    ranked = [(snippet_recency_priority(s), i, s) for i, s in enumerate(pages["search_snippets"])]
+    for results in query_results[len(queries):]:
         for r in results:
             snippet = r.get("snippet", "")
             date_str = r.get("date", "")  # Serper often returns date like "3 days ago", "Jan 15, 2024", etc.
             
             if snippet and len(snippet) > 50:
                 # Check for high-value content
-                if any(kw in snippet.lower() for kw in [
-                    "billion", "million", "committed", "allocated", "allocation",
-                    "private equity", "real estate", "real assets", "hedge fund",
-                    "cio", "chief investment", "consultant", "verus", "nepc", "callan",
-                    "co-invest", "coinvest", "direct investment"
-                ]):
-                    if snippet not in pages["search_snippets"]:
+                if _contains_any(snippet.lower(), ENRICHMENT_SNIPPET_KEYWORDS):
+                    if snippet not in seen:
                         # Add date context if available
-                        if date_str:
-                            pages["search_snippets"].append(f"[{date_str}] {snippet}")
-                        else:
-                            pages["search_snippets"].append(snippet)
-    
-    # Sort snippets to prioritize recent ones
-    pages["search_snippets"] = sort_snippets_by_recency(pages["search_snippets"])
+                        entry = f"[{date_str}] {snippet}" if date_str else snippet
+                        seen.add(entry)
+                        ranked.append((snippet_recency_priority(entry), len(ranked), entry))
     
-    # Keep more snippets - they contain the best data
-    pages["search_snippets"] = pages["search_snippets"][:20]
+    # Recent snippets first; keep more of them - they contain the best data
+    pages["search_snippets"] = [s for _, _, s in heapq.nsmallest(MAX_SEARCH_SNIPPETS, ranked)]
     
     logger.info(f"Total search snippets for {allocator_name}: {len(pages['search_snippets'])}")
     
     return pages
 
 
+def snippet_recency_priority(snippet: str) -> int:
+    """
+    Recency priority of a snippet:
+    0 = recent (2024-2025)
+    1 = no date detected
+    2 = old (before 2024)
+    """
+    # Check for bracketed date at start like "[Jan 15, 2025]"
+    bracket_match = _BRACKET_DATE_RE.match(snippet)
+    if bracket_match:
+        date_str = bracket_match.group(1).lower()
+        
+        # Check for relative dates (recent)
+        if any(x in date_str for x in _RELATIVE_DATE_WORDS):
+            return 0  # Recent
+        
+        # Check for year
+        year_match = _YEAR_RE.search(date_str)
+        if year_match:
+            year = int('20' + year_match.group(1))
+            return 0 if year >= 2024 else 2
+    
+    # Check for years in the snippet itself
+    years_in_text = _YEAR_WORD_RE.findall(snippet)
+    if years_in_text:
+        # Get the most recent year mentioned
+        max_year = max(int('20' + y) for y in years_in_text)
+        if max_year >= 2024:
+            return 0
+        elif max_year <= 2020:
+            return 2  # Old data - deprioritize
+    
+    # No date detected
+    return 1
+
+
 def sort_snippets_by_recency(snippets: list) -> list:
     """
     Sort snippets to prioritize recent ones.
     Snippets with recent dates come first, old dates go to the end,
     and snippets without dates stay in the middle.
     """
-    from datetime import datetime
-    import re
-    
-    def extract_year(snippet: str) -> tuple:
-        """
-        Returns (priority, snippet) where priority is:
-        0 = recent (2024-2025)
-        1 = no date detected
-        2 = old (before 2024)
-        """
-        # Check for bracketed date at start like "[Jan 15, 2025]"
-        bracket_match = re.match(r'\[([^\]]+)\]', snippet)
-        if bracket_match:
-            date_str = bracket_match.group(1).lower()
-            
-            # Check for relative dates (recent)
-            if any(x in date_str for x in ['day', 'hour', 'minute', 'week', 'month ago']):
-                return (0, snippet)  # Recent
-            
-            # Check for year
-            year_match = re.search(r'20(\d{2})', date_str)
-            if year_match:
-                year = int('20' + year_match.group(1))
-                if year >= 2024:
-                    return (0, snippet)  # Recent
-                else:
-                    return (2, snippet)  # Old
-        
-        # Check for years in the snippet itself
-        years_in_text = re.findall(r'\b20(\d{2})\b', snippet)
-        if years_in_text:
-            # Get the most recent year mentioned
-            max_year = max(int('20' + y) for y in years_in_text)
-            if max_year >= 2024:
-                return (0, snippet)
-            elif max_year <= 2020:
-                return (2, snippet)  # Old data - deprioritize
-        
-        # No date detected
-        return (1, snippet)
-    
-    # Sort by priority
-    sorted_snippets = sorted(snippets, key=lambda s: extract_year(s)[0])
-    return sorted_snippets
+    return sorted(snippets, key=snippet_recency_priority)